@@ -0,0 +1,133 @@
+import argparse
+import contextlib
+import json
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+
+# Runs the numbered queries of queries.sql ("-- 3) All grades for ...") against school.db
+# built by create_db.py at one or more sizes, and reports per query the timing, the row count
+# and the EXPLAIN QUERY PLAN as JSON.
+#   python benchmarks/queries.py --sizes 0,100000,1000000 --output report.json
+# Comparing against a stored run, exit code 1 on a regression:
+#   python benchmarks/queries.py --sizes 0,100000 --output baseline.json
+#   python benchmarks/queries.py --sizes 0,100000 --baseline baseline.json --tolerance 0.5
+#
+# A regression is a table that the baseline plan read with SEARCH (an index or rowid lookup)
+# and the new plan reads with SCAN (the whole table or index), or a median time worse than the
+# baseline by more than --tolerance. Sub-millisecond timings are too noisy to compare, so a
+# query must also be slower by at least --min-ms.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "..")
+sys.path.insert(0, APP_DIR)
+
+from index_advisor import parse_queries, query_plan, time_query
+
+QUERIES_PATH = os.path.join(APP_DIR, "queries.sql")
+PLAN_ACCESS = re.compile(r"^(SEARCH|SCAN) (\w+)")
+
+
+def build_database(path: str, students: int, grades: int, seed: int) -> None:
+    import create_db
+
+    # create_db reports its progress on stdout, which is where the JSON report goes
+    with contextlib.redirect_stdout(sys.stderr):
+        create_db.load(path, students, grades, seed)
+
+
+def run_size(students: int, args, queries: list[tuple[int, str, str]]) -> list[dict]:
+    path = os.path.join(args.data_dir, f"school-{students}-{args.grades}-{args.seed}.db")
+    if not (args.reuse and os.path.exists(path)):
+        print(f"building {path}", file=sys.stderr)
+        build_database(path, students, args.grades, args.seed)
+
+    reports = []
+    conn = sqlite3.connect(path)
+    try:
+        for number, title, sql in queries:
+            rows, samples = time_query(conn, sql, args.repeat)
+            reports.append({
+                "students": students,
+                "query": number,
+                "title": title,
+                "rows": rows,
+                "median_ms": round(statistics.median(samples) * 1000, 3),
+                "min_ms": round(min(samples) * 1000, 3),
+                "plan": query_plan(conn, sql),
+            })
+    finally:
+        conn.close()
+    return reports
+
+
+def scanned_tables(plan: list[str]) -> tuple[set[str], set[str]]:
+    # (tables read with SEARCH, tables read with SCAN), by the name or alias used in the query
+    search, scan = set(), set()
+    for detail in plan:
+        match = PLAN_ACCESS.match(detail)
+        if match:
+            (search if match[1] == "SEARCH" else scan).add(match[2])
+    return search, scan
+
+
+def compare(reports: list[dict], baseline: list[dict], tolerance: float, min_ms: float) -> list[str]:
+    regressions = []
+    previous = {(r["students"], r["query"]): r for r in baseline}
+    for report in reports:
+        base = previous.get((report["students"], report["query"]))
+        if base is None:
+            continue
+        name = f"students={report['students']} query {report['query']}) {report['title']}"
+        searched_before, _ = scanned_tables(base["plan"])
+        _, scanned_now = scanned_tables(report["plan"])
+        for table in sorted(searched_before & scanned_now):
+            regressions.append(f"{name}: {table} went from SEARCH to SCAN, plan {base['plan']} -> {report['plan']}")
+        slower = report["median_ms"] - base["median_ms"]
+        if report["median_ms"] > base["median_ms"] * (1 + tolerance) and slower >= min_ms:
+            regressions.append(f"{name}: median {base['median_ms']}ms -> {report['median_ms']}ms")
+    return regressions
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Time the queries of queries.sql and check their plans")
+    parser.add_argument("--sizes", default="0,100000", help="comma separated generated student counts")
+    parser.add_argument("--grades", type=int, default=5, help="grades per generated student")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per query after a warm-up")
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--data-dir", default=tempfile.gettempdir())
+    parser.add_argument("--reuse", action="store_true", help="use an existing database of the same size and seed")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--min-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    queries = parse_queries(args.queries)
+    if not queries:
+        parser.error(f"no numbered queries in {args.queries}")
+    reports = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        reports.extend(run_size(size, args, queries))
+
+    text = json.dumps(reports, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(reports, json.load(f), args.tolerance, args.min_ms)
+        for line in regressions:
+            print("REGRESSION", line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,27 +1,34 @@
+import argparse
+import json
 import os
+import random
+import re
 import sqlite3
-
-# Ensure lecture_4 directory exists and set file paths
-os.makedirs("lecture_4", exist_ok=True)
-db_path = os.path.join( "school.db")
-sql_path = os.path.join("queries.sql")
-
-# Connect to the SQLite database
-conn = sqlite3.connect(db_path)
-cur = conn.cursor()
-
-# Enable foreign key constraints
-cur.execute("PRAGMA foreign_keys = ON")
-
-# Create tables if they do not exist
-cur.executescript("""
-CREATE TABLE IF NOT EXISTS students (
+import time
+
+# Builds school.db: the nine sample students with their grades, plus any number of generated
+# students from a seeded RNG, so the same arguments always give the same database.
+#   python create_db.py                                   # just the sample data
+#   python create_db.py --students 1000000 --grades 5     # 1M more students, 5 grades each
+#
+# The database is built in a temporary file and moved over school.db at the end, so running
+# it again replaces the data instead of adding duplicates, and an interrupted load leaves the
+# previous database alone.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(HERE, "school.db")
+QUERIES_PATH = os.path.join(HERE, "queries.sql")
+DUMP_PATH = os.path.join(HERE, "school_dump.sql")
+DUMP_BATCH = 1000 # Rows per INSERT statement and per fetchmany()
+
+SCHEMA = """
+CREATE TABLE students (
     id INTEGER PRIMARY KEY,
     full_name TEXT NOT NULL,
     birth_year INTEGER
 );
 
-CREATE TABLE IF NOT EXISTS grades (
+CREATE TABLE grades (
     id INTEGER PRIMARY KEY,
     student_id INTEGER,
     subject TEXT NOT NULL,
@@ -30,166 +37,430 @@ CREATE TABLE IF NOT EXISTS grades (
         ON DELETE SET NULL
         ON UPDATE CASCADE
 );
-""")
-conn.commit()
-
-# Insert sample students
-students_data = [
-    ('Alice Johnson', 2005),
-    ('Brian Smith', 2004),
-    ('Carla Reyes', 2006),
-    ('Daniel Kim', 2005),
-    ('Eva Thompson', 2003),
-    ('Felix Nguyen', 2007),
-    ('Grace Patel', 2005),
-    ('Henry Lopez', 2004),
-    ('Isabella Martinez', 2006)
-]
-cur.executemany("INSERT INTO students (full_name, birth_year) VALUES (?, ?)", students_data)
-conn.commit()
-
-# Build a mapping from student full_name to id
-cur.execute("SELECT id, full_name FROM students ORDER BY id")
-students_id_map = {name: sid for sid, name in cur.fetchall()}
-
-# Insert sample grades using student ids
-grades_data = [
-    (students_id_map['Alice Johnson'], 'Math', 88),
-    (students_id_map['Alice Johnson'], 'English', 92),
-    (students_id_map['Alice Johnson'], 'Science', 85),
-
-    (students_id_map['Brian Smith'], 'Math', 75),
-    (students_id_map['Brian Smith'], 'History', 83),
-    (students_id_map['Brian Smith'], 'English', 79),
-
-    (students_id_map['Carla Reyes'], 'Science', 95),
-    (students_id_map['Carla Reyes'], 'Math', 91),
-    (students_id_map['Carla Reyes'], 'Art', 89),
-
-    (students_id_map['Daniel Kim'], 'Math', 84),
-    (students_id_map['Daniel Kim'], 'Science', 88),
-    (students_id_map['Daniel Kim'], 'Physical Education', 93),
-
-    (students_id_map['Eva Thompson'], 'English', 90),
-    (students_id_map['Eva Thompson'], 'History', 85),
-    (students_id_map['Eva Thompson'], 'Math', 88),
-
-    (students_id_map['Felix Nguyen'], 'Science', 72),
-    (students_id_map['Felix Nguyen'], 'Math', 78),
-    (students_id_map['Felix Nguyen'], 'English', 81),
-
-    (students_id_map['Grace Patel'], 'Art', 94),
-    (students_id_map['Grace Patel'], 'Science', 87),
-    (students_id_map['Grace Patel'], 'Math', 90),
-
-    (students_id_map['Henry Lopez'], 'History', 77),
-    (students_id_map['Henry Lopez'], 'Math', 83),
-    (students_id_map['Henry Lopez'], 'Science', 80),
-
-    (students_id_map['Isabella Martinez'], 'English', 96),
-    (students_id_map['Isabella Martinez'], 'Math', 89),
-    (students_id_map['Isabella Martinez'], 'Art', 92)
-]
-cur.executemany("INSERT INTO grades (student_id, subject, grade) VALUES (?, ?, ?)", grades_data)
-conn.commit()
+"""
 
-# Create indexes to speed up common queries
-cur.executescript("""
-CREATE INDEX IF NOT EXISTS idx_grades_student_id ON grades(student_id);
+# Built after the rows are in: filling an index once from sorted data is much cheaper than
+# updating it on every insert. The grades indexes cover the queries of queries.sql, so those
+# never visit the grades table itself:
+#   (student_id, grade, subject)  a student's grades (3), grades < 80 per student (8) and
+#                                 recomputing a student's totals in the triggers
+#   (subject, grade)              averages per subject (6)
+#   (birth_year, full_name)       students by birth year (5); on birth_year alone every match
+#                                 costs a table lookup, slower than a scan for wide ranges
+# "create_db.py advise" checks the set against queries.sql.
+INDEXES = """
+DROP INDEX IF EXISTS idx_grades_student_id;
+DROP INDEX IF EXISTS idx_grades_subject;
+CREATE INDEX IF NOT EXISTS idx_grades_student_id_grade_subject ON grades(student_id, grade, subject);
+CREATE INDEX IF NOT EXISTS idx_grades_subject_grade ON grades(subject, grade);
 CREATE INDEX IF NOT EXISTS idx_students_full_name ON students(full_name);
-CREATE INDEX IF NOT EXISTS idx_grades_subject ON grades(subject);
-""")
-conn.commit()
-
-# Create a view for average grades per student
-cur.execute("DROP VIEW IF EXISTS average_grades")
-cur.executescript("""
-CREATE VIEW IF NOT EXISTS average_grades AS
-SELECT s.id AS student_id, s.full_name, ROUND(AVG(g.grade),2) AS average_grade
-FROM students s
-LEFT JOIN grades g ON s.id = g.student_id
-GROUP BY s.id;
-""")
-conn.commit()
-
-# Write SQL script (CREATE / INSERT / SELECT / INDEX / VIEW) to file
-sql_file_content = f"""
--- CREATE TABLES
-CREATE TABLE IF NOT EXISTS students (
-    id INTEGER PRIMARY KEY,
-    full_name TEXT NOT NULL,
-    birth_year INTEGER
-);
+CREATE INDEX IF NOT EXISTS idx_students_birth_year_full_name ON students(birth_year, full_name);
+"""
 
-CREATE TABLE IF NOT EXISTS grades (
-    id INTEGER PRIMARY KEY,
-    student_id INTEGER,
-    subject TEXT NOT NULL,
-    grade INTEGER CHECK (grade BETWEEN 1 AND 100),
-    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE SET NULL ON UPDATE CASCADE
+# Per-student sum, count and average of the grades, one row for every student (count 0 and a
+# NULL average for one without grades), kept current by triggers so reading averages never
+# aggregates grades. Filled in one pass after a bulk load, before the triggers exist.
+AVERAGES_TABLE = """
+CREATE TABLE IF NOT EXISTS student_grade_totals (
+    student_id INTEGER PRIMARY KEY,
+    grade_sum INTEGER NOT NULL,
+    grade_count INTEGER NOT NULL,
+    average_grade REAL
 );
-
--- INSERT STUDENTS
 """
 
-cur.execute("SELECT full_name, birth_year FROM students ORDER BY id")
-for name, by in cur.fetchall():
-    safe_name = name.replace("'", "''")
-    sql_file_content += f"INSERT INTO students (full_name, birth_year) VALUES ('{safe_name}', {by});\n"
-
-sql_file_content += "\n-- INSERT GRADES\n"
-cur.execute("SELECT student_id, subject, grade FROM grades ORDER BY id")
-for sid, subj, gr in cur.fetchall():
-    safe_subj = subj.replace("'", "''")
-    sql_file_content += f"INSERT INTO grades (student_id, subject, grade) VALUES ({sid}, '{safe_subj}', {gr});\n"
-
-sql_file_content += """
--- 3) All grades for Alice Johnson
-SELECT g.subject, g.grade
-FROM grades g
-JOIN students s ON s.id = g.student_id
-WHERE s.full_name = 'Alice Johnson';
-
--- 4) Average grade per student
-SELECT s.id, s.full_name, ROUND(AVG(g.grade),2) AS average_grade
+# For one student, the same numbers the triggers maintain, used to (re)compute rows in bulk
+_TOTALS_FROM_GRADES = """
+SELECT s.id AS student_id, COALESCE(SUM(g.grade), 0), COUNT(g.grade), ROUND(AVG(g.grade), 2)
 FROM students s
-LEFT JOIN grades g ON s.id = g.student_id
-GROUP BY s.id;
-
--- 5) Students born after 2004
-SELECT id, full_name, birth_year FROM students WHERE birth_year > 2004;
+LEFT JOIN grades g ON g.student_id = s.id
+{where}GROUP BY s.id"""
 
--- 6) Average grade per subject
-SELECT subject, ROUND(AVG(grade), 2) AS average_grade FROM grades GROUP BY subject;
+# Whole table in one pass, on a fresh load or a rebuild
+AVERAGES_FILL = f"INSERT OR REPLACE INTO student_grade_totals {_TOTALS_FROM_GRADES.format(where='')}"
 
--- 7) Top 3 students with highest average
-SELECT s.id, s.full_name, ROUND(AVG(g.grade),2) AS average_grade
-FROM students s
-JOIN grades g ON s.id = g.student_id
-GROUP BY s.id
-ORDER BY average_grade DESC
-LIMIT 3;
+# Top-N by average reads N index entries instead of sorting every student
+AVERAGES_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_student_grade_totals_average ON student_grade_totals(average_grade);
+"""
 
--- 8) Students who scored below 80 in any subject
-SELECT DISTINCT s.id, s.full_name, g.subject, g.grade
-FROM students s
-JOIN grades g ON s.id = g.student_id
-WHERE g.grade < 80;
+# Add or take away one grade; NULL grades don't count, like in AVG()
+_GRADE_CHANGE = """
+    UPDATE student_grade_totals
+    SET grade_sum = grade_sum {sign} {row}.grade,
+        grade_count = grade_count {sign} 1,
+        average_grade = CASE WHEN grade_count {sign} 1 = 0 THEN NULL
+            ELSE ROUND(CAST(grade_sum {sign} {row}.grade AS REAL) / (grade_count {sign} 1), 2) END
+    WHERE student_id = {row}.student_id AND {row}.grade IS NOT NULL;"""
+
+# A student's row is recomputed from grades when the student appears or changes id. That is
+# right whichever way round the ON UPDATE CASCADE of grades.student_id runs.
+_STUDENT_TOTALS = (
+    "\n    INSERT OR REPLACE INTO student_grade_totals (student_id, grade_sum, grade_count, average_grade)"
+    + _TOTALS_FROM_GRADES.format(where="WHERE s.id = new.id ") + ";"
+)
+
+AVERAGES_TRIGGERS = f"""
+CREATE TRIGGER IF NOT EXISTS grades_totals_ai AFTER INSERT ON grades BEGIN{_GRADE_CHANGE.format(sign="+", row="new")}
+END;
+CREATE TRIGGER IF NOT EXISTS grades_totals_ad AFTER DELETE ON grades BEGIN{_GRADE_CHANGE.format(sign="-", row="old")}
+END;
+CREATE TRIGGER IF NOT EXISTS grades_totals_au AFTER UPDATE OF student_id, grade ON grades BEGIN{_GRADE_CHANGE.format(sign="-", row="old")}{_GRADE_CHANGE.format(sign="+", row="new")}
+END;
+CREATE TRIGGER IF NOT EXISTS students_totals_ai AFTER INSERT ON students BEGIN{_STUDENT_TOTALS}
+END;
+CREATE TRIGGER IF NOT EXISTS students_totals_au AFTER UPDATE OF id ON students BEGIN
+    DELETE FROM student_grade_totals WHERE student_id = old.id;{_STUDENT_TOTALS}
+END;
+CREATE TRIGGER IF NOT EXISTS students_totals_ad AFTER DELETE ON students BEGIN
+    DELETE FROM student_grade_totals WHERE student_id = old.id;
+END;
+"""
 
--- INDEXES
-CREATE INDEX IF NOT EXISTS idx_grades_student_id ON grades(student_id);
-CREATE INDEX IF NOT EXISTS idx_students_full_name ON students(full_name);
-CREATE INDEX IF NOT EXISTS idx_grades_subject ON grades(subject);
+# Same name and rows as the old GROUP BY view, now a lookup per student
+VIEWS = """
+DROP VIEW IF EXISTS average_grades;
+CREATE VIEW average_grades AS
+SELECT s.id AS student_id, s.full_name, t.average_grade
+FROM student_grade_totals t
+JOIN students s ON s.id = t.student_id;
+"""
 
--- VIEW average_grades
-CREATE VIEW IF NOT EXISTS average_grades AS
-SELECT s.id AS student_id, s.full_name, ROUND(AVG(g.grade),2) AS average_grade
-FROM students s
-LEFT JOIN grades g ON s.id = g.student_id
-GROUP BY s.id;
+# Only safe on a file nobody else uses yet: without a journal a crash corrupts the database,
+# which here is the temporary file that gets thrown away
+BULK_PRAGMAS = """
+PRAGMA journal_mode = OFF;
+PRAGMA synchronous = OFF;
+PRAGMA locking_mode = EXCLUSIVE;
+PRAGMA temp_store = MEMORY;
+PRAGMA cache_size = -262144;
+PRAGMA threads = 4;
 """
 
-with open(sql_path, "w", encoding="utf-8") as f:
-    f.write(sql_file_content)
+# queries.sql carries the same indexes, averages table, triggers and view between these markers,
+# so its numbered queries run on a database built from the file alone. "write-queries" writes it.
+QUERIES_SETUP_BEGIN = '-- BEGIN SETUP (generated by "python create_db.py write-queries", don\'t edit by hand)'
+QUERIES_SETUP_END = "-- END SETUP"
+
+SAMPLE_STUDENTS = [
+    ('Alice Johnson', 2005),
+    ('Brian Smith', 2004),
+    ('Carla Reyes', 2006),
+    ('Daniel Kim', 2005),
+    ('Eva Thompson', 2003),
+    ('Felix Nguyen', 2007),
+    ('Grace Patel', 2005),
+    ('Henry Lopez', 2004),
+    ('Isabella Martinez', 2006)
+]
+
+# (student id, subject, grade), ids of SAMPLE_STUDENTS in order
+SAMPLE_GRADES = [
+    (1, 'Math', 88), (1, 'English', 92), (1, 'Science', 85),
+    (2, 'Math', 75), (2, 'History', 83), (2, 'English', 79),
+    (3, 'Science', 95), (3, 'Math', 91), (3, 'Art', 89),
+    (4, 'Math', 84), (4, 'Science', 88), (4, 'Physical Education', 93),
+    (5, 'English', 90), (5, 'History', 85), (5, 'Math', 88),
+    (6, 'Science', 72), (6, 'Math', 78), (6, 'English', 81),
+    (7, 'Art', 94), (7, 'Science', 87), (7, 'Math', 90),
+    (8, 'History', 77), (8, 'Math', 83), (8, 'Science', 80),
+    (9, 'English', 96), (9, 'Math', 89), (9, 'Art', 92)
+]
+
+FIRST_NAMES = [
+    "Alice", "Brian", "Carla", "Daniel", "Eva", "Felix", "Grace", "Henry", "Isabella", "Jack",
+    "Karen", "Liam", "Maria", "Noah", "Olivia", "Peter", "Quinn", "Rosa", "Samuel", "Tina",
+    "Umar", "Vera", "William", "Xenia", "Yusuf", "Zoe", "Aaron", "Bella", "Chen", "Diana",
+]
+LAST_NAMES = [
+    "Johnson", "Smith", "Reyes", "Kim", "Thompson", "Nguyen", "Patel", "Lopez", "Martinez",
+    "Brown", "Garcia", "Miller", "Davis", "Wilson", "Anderson", "Taylor", "Moore", "Jackson",
+    "White", "Harris", "Clark", "Lewis", "Walker", "Young", "King", "Wright", "Scott", "Green",
+    "Baker", "Adams", "Nelson", "Hill", "Campbell", "Mitchell", "Roberts", "Carter", "Novak",
+]
+SUBJECTS = [
+    "Math", "English", "Science", "History", "Art", "Physical Education", "Geography",
+    "Biology", "Chemistry", "Physics", "Music", "Literature", "Computer Science", "Economics",
+]
+
 
-conn.close()
\ No newline at end of file
+def generate_students(rng: random.Random, first_id: int, count: int):
+    # (id, full_name, birth_year); ids are assigned here so grades can refer to them
+    # without reading anything back. rng.random() with precomputed tables instead of
+    # choice()/randint(), which cost several times more per row.
+    names = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    random, n_names = rng.random, len(names)
+    for student_id in range(first_id, first_id + count):
+        yield student_id, names[int(random() * n_names)], 2000 + int(random() * 11)
+
+
+def generate_grades(rng: random.Random, first_student: int, students: int, per_student: int):
+    # (student_id, subject, grade): per_student different subjects for every student, the
+    # grades spread around a per-student level so averages differ between students.
+    # Subject sets and normal deviates are drawn once into tables and picked per row.
+    combos = [rng.sample(SUBJECTS, per_student) for _ in range(4096)]
+    levels = [rng.gauss(80, 8) for _ in range(4096)]
+    noise = [rng.gauss(0, 7) for _ in range(4096)]
+    random = rng.random
+    for student_id in range(first_student, first_student + students):
+        level = levels[int(random() * 4096)]
+        for subject in combos[int(random() * 4096)]:
+            grade = round(level + noise[int(random() * 4096)])
+            yield student_id, subject, 100 if grade > 100 else 1 if grade < 1 else grade
+
+
+def report(label: str, rows: int, seconds: float) -> None:
+    rate = rows / seconds if seconds else float("inf")
+    print(f"{label}: {rows} rows in {seconds:.2f}s ({rate:,.0f} rows/s)")
+
+
+def create_averages(conn: sqlite3.Connection) -> None:
+    # Creates student_grade_totals and fills it from the current grades if it doesn't exist yet,
+    # then makes sure the index, triggers and view are in place
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'student_grade_totals'").fetchone()
+    conn.execute("BEGIN")
+    conn.execute(AVERAGES_TABLE)
+    if not exists:
+        conn.execute(AVERAGES_FILL)
+    conn.execute("COMMIT")
+    conn.executescript(AVERAGES_INDEX + AVERAGES_TRIGGERS + VIEWS)
+
+
+def rebuild_averages(conn: sqlite3.Connection) -> None:
+    conn.execute("BEGIN")
+    conn.execute(AVERAGES_TABLE)
+    conn.execute("DELETE FROM student_grade_totals")
+    conn.execute(AVERAGES_FILL)
+    conn.execute("COMMIT")
+    conn.executescript(AVERAGES_INDEX + AVERAGES_TRIGGERS + VIEWS)
+
+
+def queries_setup() -> str:
+    # Everything load adds after the rows are in, as one script
+    script = "\n".join([
+        "-- INDEXES" + INDEXES,
+        "-- AVERAGES, filled once and kept current by the triggers" + AVERAGES_TABLE + "\n" + AVERAGES_FILL + ";\n"
+        + AVERAGES_INDEX,
+        "-- TRIGGERS" + AVERAGES_TRIGGERS,
+        "-- VIEW average_grades" + VIEWS,
+    ])
+    script = "\n".join(line.rstrip() for line in script.splitlines())
+    return re.sub(r"\n{3,}", "\n\n", script).strip() + "\n"
+
+
+def write_queries(path: str) -> bool:
+    # Replace the setup section of queries.sql, returns True when it was out of date
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    start = text.index(QUERIES_SETUP_BEGIN) + len(QUERIES_SETUP_BEGIN)
+    end = text.index(QUERIES_SETUP_END, start)
+    updated = text[:start] + "\n" + queries_setup() + text[end:]
+    if updated == text:
+        return False
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(updated)
+    return True
+
+
+def verify_averages(conn: sqlite3.Connection, limit: int = 20) -> list[tuple]:
+    # Rows where student_grade_totals differs from a full recompute, either side missing
+    # included: (student_id, stored (sum, count, average) or None, actual or None)
+    conn.execute(f"CREATE TEMP TABLE recomputed AS {_TOTALS_FROM_GRADES.format(where='')}")
+    try:
+        ids = conn.execute(
+            "SELECT student_id FROM (SELECT * FROM student_grade_totals EXCEPT SELECT * FROM recomputed) "
+            "UNION SELECT student_id FROM (SELECT * FROM recomputed EXCEPT SELECT * FROM student_grade_totals) "
+            "ORDER BY 1 LIMIT ?",
+            (limit,),
+        ).fetchall()
+        mismatches = []
+        for (student_id,) in ids:
+            stored, actual = (
+                conn.execute(f"SELECT * FROM {table} WHERE student_id = ?", (student_id,)).fetchone()
+                for table in ("student_grade_totals", "recomputed")
+            )
+            mismatches.append((student_id, stored and stored[1:], actual and actual[1:]))
+        return mismatches
+    finally:
+        conn.execute("DROP TABLE temp.recomputed")
+
+
+def load(path: str, students: int, grades: int, seed: int) -> None:
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path) # Left over from an interrupted run
+
+    rng = random.Random(seed)
+    first_id = len(SAMPLE_STUDENTS) + 1
+    started = time.perf_counter()
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        conn.executescript(BULK_PRAGMAS)
+        conn.executescript(SCHEMA)
+        # All rows in one transaction. executescript() commits whatever is open, so it's only
+        # used outside of it
+        conn.execute("BEGIN")
+
+        phase = time.perf_counter()
+        conn.executemany("INSERT INTO students (full_name, birth_year) VALUES (?, ?)", SAMPLE_STUDENTS)
+        conn.executemany(
+            "INSERT INTO students (id, full_name, birth_year) VALUES (?, ?, ?)",
+            generate_students(rng, first_id, students),
+        )
+        report("students", len(SAMPLE_STUDENTS) + students, time.perf_counter() - phase)
+
+        phase = time.perf_counter()
+        conn.executemany("INSERT INTO grades (student_id, subject, grade) VALUES (?, ?, ?)", SAMPLE_GRADES)
+        conn.executemany(
+            "INSERT INTO grades (student_id, subject, grade) VALUES (?, ?, ?)",
+            generate_grades(rng, first_id, students, grades),
+        )
+        conn.execute("COMMIT")
+        report("grades", len(SAMPLE_GRADES) + students * grades, time.perf_counter() - phase)
+
+        phase = time.perf_counter()
+        conn.executescript(INDEXES)
+        create_averages(conn)
+        # Statistics for the query planner, from a sample of each index so it stays quick
+        conn.execute("PRAGMA analysis_limit = 1000")
+        conn.execute("ANALYZE")
+        print(f"indexes, averages and views: {time.perf_counter() - phase:.2f}s")
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+    total_rows = len(SAMPLE_STUDENTS) + students + len(SAMPLE_GRADES) + students * grades
+    report("total", total_rows, time.perf_counter() - started)
+
+
+def dump(path: str, dump_path: str, batch: int = DUMP_BATCH) -> None:
+    # Writes the database as SQL, streamed: rows come from fetchmany() and go to the file a
+    # batch at a time, as one multi-row INSERT per batch, so memory stays flat at any size.
+    # Like the sqlite3 shell's .dump the tables and their rows come first and the indexes,
+    # triggers and views last, which lets a restore run at bulk load speed. quote() renders the
+    # values as SQL literals inside SQLite, exactly (REALs round-trip).
+    started = time.perf_counter()
+    rows_written = 0
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        schema = conn.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY rowid"
+        ).fetchall()
+        tables = [name for kind, name, _ in schema if kind == "table"]
+        with open(dump_path, "w", encoding="utf-8", newline="\n") as out:
+            out.write("PRAGMA foreign_keys = OFF;\nBEGIN TRANSACTION;\n")
+            for kind, _, sql in schema:
+                if kind == "table":
+                    out.write(f"{sql};\n")
+            for table in tables:
+                columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+                names = ", ".join(f'"{column}"' for column in columns)
+                values = " || ',' || ".join(f'quote("{column}")' for column in columns)
+                insert = f'INSERT INTO "{table}" ({names}) VALUES\n'
+                cursor = conn.execute(f"SELECT '(' || {values} || ')' FROM \"{table}\"")
+                while rows := cursor.fetchmany(batch):
+                    out.write(insert)
+                    out.write(",\n".join(row for (row,) in rows))
+                    out.write(";\n")
+                    rows_written += len(rows)
+            for kind, _, sql in schema:
+                if kind != "table":
+                    out.write(f"{sql};\n")
+            out.write("COMMIT;\nPRAGMA analysis_limit = 1000;\nANALYZE;\n")
+    finally:
+        conn.close()
+    report(f"dump ({os.path.getsize(dump_path) / 2**20:.1f} MB)", rows_written, time.perf_counter() - started)
+
+
+def dump_statements(dump_path: str):
+    # Statements of a dump one at a time, never the whole file in memory. Every statement the
+    # dump writes ends a line with ";", complete_statement() rules out one inside a string.
+    lines = []
+    with open(dump_path, encoding="utf-8") as f:
+        for line in f:
+            lines.append(line)
+            if line.rstrip().endswith(";"):
+                statement = "".join(lines)
+                if sqlite3.complete_statement(statement):
+                    yield statement
+                    lines = []
+    if "".join(lines).strip():
+        raise ValueError(f"{dump_path} ends in the middle of a statement")
+
+
+def restore(dump_path: str, path: str) -> None:
+    # Loads a dump into a new database that replaces path only once it's complete, with the
+    # same bulk-load pragmas as load(); the dump itself runs in one transaction
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    started = time.perf_counter()
+    rows = 0
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        conn.executescript(BULK_PRAGMAS)
+        for statement in dump_statements(dump_path):
+            cursor = conn.execute(statement)
+            if statement.startswith("INSERT"):
+                rows += cursor.rowcount
+    except BaseException:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+    os.replace(tmp_path, path)
+    report("restore", rows, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create school.db")
+    parser.add_argument("command", nargs="?", default="load", choices=["load", "verify", "rebuild-averages", "advise", "dump", "restore", "write-queries"])
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--students", type=int, default=0, help="generated students on top of the sample ones")
+    parser.add_argument("--grades", type=int, default=3, help="grades per generated student")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--queries", default=QUERIES_PATH, help="query file for advise and write-queries")
+    parser.add_argument("--dump-file", default=DUMP_PATH, help="SQL file written by dump and read by restore")
+    args = parser.parse_args()
+    if args.students < 0 or not 0 <= args.grades <= len(SUBJECTS):
+        parser.error(f"--students can't be negative and --grades must be between 0 and {len(SUBJECTS)}")
+
+    if args.command == "load":
+        load(args.db, args.students, args.grades, args.seed)
+    elif args.command == "verify":
+        # Compare student_grade_totals with a recompute from grades, exit code 1 on any mismatch
+        conn = sqlite3.connect(args.db, isolation_level=None)
+        try:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'student_grade_totals'").fetchone():
+                raise SystemExit("student_grade_totals doesn't exist, run rebuild-averages")
+            mismatches = verify_averages(conn)
+        finally:
+            conn.close()
+        for student_id, stored, actual in mismatches:
+            print(f"student {student_id}: stored={stored} actual={actual}")
+        print("averages are consistent" if not mismatches else "averages are out of sync, run rebuild-averages")
+        raise SystemExit(1 if mismatches else 0)
+    elif args.command == "rebuild-averages":
+        # Recompute student_grade_totals from grades, also adds it to a database built before it existed
+        conn = sqlite3.connect(args.db, isolation_level=None)
+        try:
+            rebuild_averages(conn)
+        finally:
+            conn.close()
+    elif args.command == "advise":
+        # Suggest indexes for the numbered queries of queries.sql, the database is left unchanged
+        from index_advisor import advise, parse_queries
+
+        conn = sqlite3.connect(args.db, isolation_level=None)
+        try:
+            print(json.dumps(advise(conn, parse_queries(args.queries)), indent=2))
+        finally:
+            conn.close()
+    elif args.command == "dump":
+        dump(args.db, args.dump_file)
+    elif args.command == "restore":
+        restore(args.dump_file, args.db)
+    elif args.command == "write-queries":
+        # Regenerate the setup section of queries.sql after changing the schema constants above
+        print(f"{args.queries} updated" if write_queries(args.queries) else f"{args.queries} is up to date")
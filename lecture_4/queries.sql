@@ -54,6 +54,89 @@ INSERT INTO grades (student_id, subject, grade) VALUES (9, 'English', 96);
 INSERT INTO grades (student_id, subject, grade) VALUES (9, 'Math', 89);
 INSERT INTO grades (student_id, subject, grade) VALUES (9, 'Art', 92);
 
+-- BEGIN SETUP (generated by "python create_db.py write-queries", don't edit by hand)
+-- INDEXES
+DROP INDEX IF EXISTS idx_grades_student_id;
+DROP INDEX IF EXISTS idx_grades_subject;
+CREATE INDEX IF NOT EXISTS idx_grades_student_id_grade_subject ON grades(student_id, grade, subject);
+CREATE INDEX IF NOT EXISTS idx_grades_subject_grade ON grades(subject, grade);
+CREATE INDEX IF NOT EXISTS idx_students_full_name ON students(full_name);
+CREATE INDEX IF NOT EXISTS idx_students_birth_year_full_name ON students(birth_year, full_name);
+
+-- AVERAGES, filled once and kept current by the triggers
+CREATE TABLE IF NOT EXISTS student_grade_totals (
+    student_id INTEGER PRIMARY KEY,
+    grade_sum INTEGER NOT NULL,
+    grade_count INTEGER NOT NULL,
+    average_grade REAL
+);
+
+INSERT OR REPLACE INTO student_grade_totals
+SELECT s.id AS student_id, COALESCE(SUM(g.grade), 0), COUNT(g.grade), ROUND(AVG(g.grade), 2)
+FROM students s
+LEFT JOIN grades g ON g.student_id = s.id
+GROUP BY s.id;
+
+CREATE INDEX IF NOT EXISTS idx_student_grade_totals_average ON student_grade_totals(average_grade);
+
+-- TRIGGERS
+CREATE TRIGGER IF NOT EXISTS grades_totals_ai AFTER INSERT ON grades BEGIN
+    UPDATE student_grade_totals
+    SET grade_sum = grade_sum + new.grade,
+        grade_count = grade_count + 1,
+        average_grade = CASE WHEN grade_count + 1 = 0 THEN NULL
+            ELSE ROUND(CAST(grade_sum + new.grade AS REAL) / (grade_count + 1), 2) END
+    WHERE student_id = new.student_id AND new.grade IS NOT NULL;
+END;
+CREATE TRIGGER IF NOT EXISTS grades_totals_ad AFTER DELETE ON grades BEGIN
+    UPDATE student_grade_totals
+    SET grade_sum = grade_sum - old.grade,
+        grade_count = grade_count - 1,
+        average_grade = CASE WHEN grade_count - 1 = 0 THEN NULL
+            ELSE ROUND(CAST(grade_sum - old.grade AS REAL) / (grade_count - 1), 2) END
+    WHERE student_id = old.student_id AND old.grade IS NOT NULL;
+END;
+CREATE TRIGGER IF NOT EXISTS grades_totals_au AFTER UPDATE OF student_id, grade ON grades BEGIN
+    UPDATE student_grade_totals
+    SET grade_sum = grade_sum - old.grade,
+        grade_count = grade_count - 1,
+        average_grade = CASE WHEN grade_count - 1 = 0 THEN NULL
+            ELSE ROUND(CAST(grade_sum - old.grade AS REAL) / (grade_count - 1), 2) END
+    WHERE student_id = old.student_id AND old.grade IS NOT NULL;
+    UPDATE student_grade_totals
+    SET grade_sum = grade_sum + new.grade,
+        grade_count = grade_count + 1,
+        average_grade = CASE WHEN grade_count + 1 = 0 THEN NULL
+            ELSE ROUND(CAST(grade_sum + new.grade AS REAL) / (grade_count + 1), 2) END
+    WHERE student_id = new.student_id AND new.grade IS NOT NULL;
+END;
+CREATE TRIGGER IF NOT EXISTS students_totals_ai AFTER INSERT ON students BEGIN
+    INSERT OR REPLACE INTO student_grade_totals (student_id, grade_sum, grade_count, average_grade)
+SELECT s.id AS student_id, COALESCE(SUM(g.grade), 0), COUNT(g.grade), ROUND(AVG(g.grade), 2)
+FROM students s
+LEFT JOIN grades g ON g.student_id = s.id
+WHERE s.id = new.id GROUP BY s.id;
+END;
+CREATE TRIGGER IF NOT EXISTS students_totals_au AFTER UPDATE OF id ON students BEGIN
+    DELETE FROM student_grade_totals WHERE student_id = old.id;
+    INSERT OR REPLACE INTO student_grade_totals (student_id, grade_sum, grade_count, average_grade)
+SELECT s.id AS student_id, COALESCE(SUM(g.grade), 0), COUNT(g.grade), ROUND(AVG(g.grade), 2)
+FROM students s
+LEFT JOIN grades g ON g.student_id = s.id
+WHERE s.id = new.id GROUP BY s.id;
+END;
+CREATE TRIGGER IF NOT EXISTS students_totals_ad AFTER DELETE ON students BEGIN
+    DELETE FROM student_grade_totals WHERE student_id = old.id;
+END;
+
+-- VIEW average_grades
+DROP VIEW IF EXISTS average_grades;
+CREATE VIEW average_grades AS
+SELECT s.id AS student_id, s.full_name, t.average_grade
+FROM student_grade_totals t
+JOIN students s ON s.id = t.student_id;
+-- END SETUP
+
 -- 3) All grades for Alice Johnson
 SELECT g.subject, g.grade
 FROM grades g
@@ -61,10 +144,9 @@ JOIN students s ON s.id = g.student_id
 WHERE s.full_name = 'Alice Johnson';
 
 -- 4) Average grade per student
-SELECT s.id, s.full_name, ROUND(AVG(g.grade),2) AS average_grade
-FROM students s
-LEFT JOIN grades g ON s.id = g.student_id
-GROUP BY s.id;
+SELECT student_id AS id, full_name, average_grade
+FROM average_grades
+ORDER BY student_id;
 
 -- 5) Students born after 2004
 SELECT id, full_name, birth_year FROM students WHERE birth_year > 2004;
@@ -73,10 +155,9 @@ SELECT id, full_name, birth_year FROM students WHERE birth_year > 2004;
 SELECT subject, ROUND(AVG(grade), 2) AS average_grade FROM grades GROUP BY subject;
 
 -- 7) Top 3 students with highest average
-SELECT s.id, s.full_name, ROUND(AVG(g.grade),2) AS average_grade
-FROM students s
-JOIN grades g ON s.id = g.student_id
-GROUP BY s.id
+SELECT student_id AS id, full_name, average_grade
+FROM average_grades
+WHERE average_grade IS NOT NULL
 ORDER BY average_grade DESC
 LIMIT 3;
 
@@ -85,15 +166,3 @@ SELECT DISTINCT s.id, s.full_name, g.subject, g.grade
 FROM students s
 JOIN grades g ON s.id = g.student_id
 WHERE g.grade < 80;
-
--- INDEXES
-CREATE INDEX IF NOT EXISTS idx_grades_student_id ON grades(student_id);
-CREATE INDEX IF NOT EXISTS idx_students_full_name ON students(full_name);
-CREATE INDEX IF NOT EXISTS idx_grades_subject ON grades(subject);
-
--- VIEW average_grades
-CREATE VIEW IF NOT EXISTS average_grades AS
-SELECT s.id AS student_id, s.full_name, ROUND(AVG(g.grade),2) AS average_grade
-FROM students s
-LEFT JOIN grades g ON s.id = g.student_id
-GROUP BY s.id;
@@ -1,3 +1,7 @@
+import base64
+import binascii
+import os
+from contextlib import asynccontextmanager
 from typing import Annotated
 
 from fastapi import FastAPI, HTTPException, Depends, Query
@@ -9,19 +13,39 @@ from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 import uvicorn
 
-app = FastAPI() # Initialize FastAPI application
+from storage import BookRepository, MemoryBookRepository
+
+# "sqlite": books.db through SQLAlchemy
+# "memory": in-process store, filled from the BOOKS_SNAPSHOT books.db file at startup
+STORAGE_BACKEND = os.getenv("BOOKS_STORAGE", "sqlite")
+SNAPSHOT_PATH = os.getenv("BOOKS_SNAPSHOT")
+memory_repository = MemoryBookRepository() if STORAGE_BACKEND == "memory" else None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if memory_repository is not None and SNAPSHOT_PATH:
+        memory_repository.load_snapshot(SNAPSHOT_PATH)
+    yield
+    await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan) # Initialize FastAPI application
 
 engine = create_async_engine('sqlite+aiosqlite:///books.db') # Async SQLite engine
 
 new_session = async_sessionmaker(engine, expire_on_commit=False) # Session factory
 
 
-async def get_session():
-    # Provide DB session for each request
+async def get_repository():
+    # Storage backend for each request
+    if memory_repository is not None:
+        yield memory_repository
+        return
     async with new_session() as session:
-        yield session
+        yield SqliteBookRepository(session)
 
-SessionDep = Annotated[AsyncSession, Depends(get_session)]
+RepositoryDep = Annotated[BookRepository, Depends(get_repository)]
 
 class Base(DeclarativeBase):
     pass
@@ -45,96 +69,170 @@ class BookSchema(BookAddSchema):
     id: int
 
 
+def book_schema(row) -> BookSchema:
+    i, t, a, y = row
+    return BookSchema(id=i, title=t, author=a, year=y)
+
+
+class SqliteBookRepository(BookRepository):
+    # books.db through SQLAlchemy, one session per request
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def list_offset(self, limit: int, offset: int) -> list:
+        query = select(BookModel.id, BookModel.title, BookModel.author, BookModel.year).limit(limit).offset(offset)
+        return (await self.session.execute(query)).all()
+
+    async def list_after(self, last_id: int, limit: int) -> list:
+        # Seek by primary key, cost doesn't depend on page depth
+        query = (select(BookModel.id, BookModel.title, BookModel.author, BookModel.year)
+                 .where(BookModel.id > last_id)
+                 .order_by(BookModel.id)
+                 .limit(limit))
+        return (await self.session.execute(query)).all()
+
+    async def find(self, title: str | None, author: str | None, year: int | None) -> list:
+        query = select(BookModel.id, BookModel.title, BookModel.author, BookModel.year)
+        conditions = []
+        if title:
+            conditions.append(func.lower(BookModel.title) == title.lower())
+        if author:
+            conditions.append(func.lower(BookModel.author) == author.lower())
+        if year is not None:
+            conditions.append(BookModel.year == year)
+
+        if conditions:
+            query = query.where(*conditions)
+        return (await self.session.execute(query)).all()
+
+    async def _check_duplicate(self, title: str, author: str, year: int | None, book_id: int | None = None) -> None:
+        # Same title, author and year (case-insensitive) is the same book
+        if year is None:
+            return
+        query = select(BookModel.id).where(
+            func.lower(BookModel.title) == title.lower(),
+            func.lower(BookModel.author) == author.lower(),
+            BookModel.year == year,
+        )
+        if book_id is not None:
+            query = query.where(BookModel.id != book_id)
+        if (await self.session.execute(query.limit(1))).first() is not None:
+            raise HTTPException(status_code=409, detail="This book already exists.")
+
+    async def insert(self, title: str, author: str, year: int | None) -> tuple:
+        await self._check_duplicate(title, author, year)
+        new_book = BookModel(title=title, author=author, year=year)
+        self.session.add(new_book)
+        await self.session.commit()
+        return new_book.id, new_book.title, new_book.author, new_book.year
+
+    async def update(self, book_id: int, values: dict) -> tuple:
+        book = await self.session.get(BookModel, book_id)
+        if book is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        await self._check_duplicate(values.get("title", book.title), values.get("author", book.author),
+                                    values.get("year", book.year), book_id)
+        await self.session.execute(update(BookModel).where(BookModel.id == book_id).values(**values))
+        await self.session.commit()
+        await self.session.refresh(book)
+        return book.id, book.title, book.author, book.year
+
+    async def delete(self, book_id: int) -> None:
+        result = await self.session.execute(delete(BookModel).where(BookModel.id == book_id))
+        await self.session.commit()
+        if result.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Book not found")
+
+    async def reset(self) -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+
 @app.post("/setup_database")
-async def setup_database():
+async def setup_database(repo: RepositoryDep):
     # Recreate tables — for testing purposes
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
-        return {"success": True}
+    await repo.reset()
+    return {"success": True}
 
 
 @app.post("/books", response_model=BookSchema)
-async def add_book(book: BookAddSchema, session: SessionDep) -> BookSchema:
-    # Check if the book is existing
-    if book.year is not None:
-        query = select(BookModel).where(
-            func.lower(BookModel.title) == book.title.lower(),
-            func.lower(BookModel.author) == book.author.lower(),
-            BookModel.year == book.year,
-        )
-        result = await session.execute(query)
-        existing = result.scalar_one_or_none()
-        if existing is not None:
-            raise HTTPException(status_code=409, detail="This book already exists.")
+async def add_book(book: BookAddSchema, repo: RepositoryDep) -> BookSchema:
+    # Add a new book, unless the same title/author/year is already there
+    return book_schema(await repo.insert(book.title, book.author, book.year))
+
+
+class BookPageSchema(BaseModel):
+    # Page of books returned in cursor mode
+    items: list[BookSchema]
+    next_cursor: str | None = None
 
-    # Add a new book into the database
-    new_book = BookModel(
-        title=book.title,
-        author=book.author,
-        year=book.year,
-    )
 
-    session.add(new_book)
-    await session.commit()
-    await session.refresh(new_book)
-    return BookSchema(id=new_book.id, title=new_book.title, author=new_book.author, year=new_book.year)
+def encode_cursor(book_id: int) -> str:
+    # Opaque cursor pointing right after the given book id
+    return base64.urlsafe_b64encode(f"id:{book_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    # Empty cursor means "start from the beginning"
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, _, value = raw.partition(":")
+        if prefix != "id":
+            raise ValueError(raw)
+        return int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @app.get("/books")
-async def get_books(session: SessionDep,
+async def get_books(repo: RepositoryDep,
                     limit: int = Query(10, ge=1, le=100),
                     offset: int = Query(0, ge=0),
+                    after: str | None = Query(default=None),
                     ):
-    # Return list of all books
-    query = select(BookModel).limit(limit).offset(offset)
-    result = await session.execute(query)
-    books = result.scalars().all()
-    if not books:
+    if after is not None:
+        # Cursor mode — seek by id, cost doesn't depend on page depth
+        rows = await repo.list_after(decode_cursor(after), limit + 1)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return BookPageSchema(
+            items=[book_schema(r) for r in rows],
+            next_cursor=encode_cursor(rows[-1][0]) if has_more else None,
+        )
+
+    # Return list of all books (offset mode, kept for compatibility)
+    rows = await repo.list_offset(limit, offset)
+    if not rows:
         return "There are no books."
-    return [BookSchema(id=b.id, title=b.title, author=b.author, year=b.year) for b in books]
+    return [book_schema(r) for r in rows]
 
 @app.delete("/books/{book_id}")
-async def delete_book(book_id: int, session: SessionDep):
+async def delete_book(book_id: int, repo: RepositoryDep):
     # Delete a book by ID
-    query = delete(BookModel).where(BookModel.id == book_id)
-    result = await session.execute(query)
-    await session.commit()
-    if result.rowcount == 0:
-        raise HTTPException(status_code=404, detail="Book not found")
+    await repo.delete(book_id)
     return {"success": "Book successfully deleted"}
 
 @app.get("/books/search")
-async def get_book(session: SessionDep,
+async def get_book(repo: RepositoryDep,
                    title: str | None = Query(default=None),
                    author: str | None = Query(default=None),
                    year: int | None = Query(default=None)):
-    query = select(BookModel)
     # Flexible search — match by title/author/year
-    conditions = []
-    if title:
-        conditions.append(func.lower(BookModel.title) == title.lower())
-    if author:
-        conditions.append(func.lower(BookModel.author) == author.lower())
-    if year is not None:
-        conditions.append(BookModel.year == year)
-
-    if conditions:
-        query = query.where(*conditions)
-
-    result = await session.execute(query)
-    books = result.scalars().all()
-    if not books:
+    rows = await repo.find(title, author, year)
+    if not rows:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    return books
+    return [book_schema(r) for r in rows]
 
 @app.put("/books/{book_id}")
-async def change_book(book_id: int, session: SessionDep,
+async def change_book(book_id: int, repo: RepositoryDep,
                    title: str | None = Query(default=None),
                    author: str | None = Query(default=None),
                    year: int | None = Query(default=None)):
-    # Check if the book with these values is existing
+    # Update book details by ID; the resulting title/author/year must not belong to another book
     values: dict[str, object] = {}
     if title is not None:
         values["title"] = title
@@ -143,49 +241,10 @@ async def change_book(book_id: int, session: SessionDep,
     if year is not None:
         values["year"] = year
 
-    if not values:
-        raise HTTPException(status_code=400, detail="Bad Request")
-    # Check if the duplicate exists
-    conditions = []
-    if "title" in values:
-        conditions.append(func.lower(BookModel.title) == values["title"].lower())
-    if "author" in values:
-        conditions.append(func.lower(BookModel.author) == values["author"].lower())
-    if "year" in values:
-        conditions.append(BookModel.year == values["year"])
-
-    if conditions:
-        dup_query = select(BookModel).where(
-            *conditions,
-            BookModel.id != book_id,
-        )
-        dup_result = await session.execute(dup_query)
-        existing = dup_result.scalar_one_or_none()
-        if existing is not None:
-            raise HTTPException(status_code=409, detail="This book already exists.")
-
-    # Update book details by ID
-    values = {}
-    if title is not None:
-        values["title"] = title
-    if author is not None:
-        values["author"] = author
-    if year is not None:
-        values["year"] = year
-
     if not values:
         raise HTTPException(status_code=400, detail="Bad Request")
 
-    query = update(BookModel).where(BookModel.id == book_id).values(**values)
-    result = await session.execute(query)
-    await session.commit()
-
-    if result.rowcount == 0:
-        raise HTTPException(status_code=404, detail="Book not found")
-    # Return updated book
-    row = await  session.execute(select(BookModel).where(BookModel.id == book_id))
-    book = row.scalar_one()
-    return BookSchema(id=book.id, title=book.title, author=book.author, year=book.year)
+    return book_schema(await repo.update(book_id, values))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,137 @@
+import bisect
+import sqlite3
+from abc import ABC, abstractmethod
+
+from fastapi import HTTPException
+
+# Storage backends for the book API. Handlers only talk to a BookRepository, so the same
+# endpoints run on SQLite (main.SqliteBookRepository) or on the in-memory store below.
+# Rows are (id, title, author, year) tuples; title/author are compared case-insensitively.
+
+Row = tuple[int, str, str, int | None]
+
+
+class BookRepository(ABC):
+    @abstractmethod
+    async def list_offset(self, limit: int, offset: int) -> list[Row]:
+        ...
+
+    @abstractmethod
+    async def list_after(self, last_id: int, limit: int) -> list[Row]:
+        # Books with id > last_id in id order
+        ...
+
+    @abstractmethod
+    async def find(self, title: str | None, author: str | None, year: int | None) -> list[Row]:
+        ...
+
+    @abstractmethod
+    async def insert(self, title: str, author: str, year: int | None) -> Row:
+        ...
+
+    @abstractmethod
+    async def update(self, book_id: int, values: dict) -> Row:
+        ...
+
+    @abstractmethod
+    async def delete(self, book_id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def reset(self) -> None:
+        # Drop every book
+        ...
+
+
+class MemoryBookRepository(BookRepository):
+    # Whole catalog in process memory, for fast test runs and read-mostly deployments that
+    # load a snapshot at startup. Methods never await, so each call is atomic on the event loop.
+    #   _books: id -> row                          (hash index on id)
+    #   _keys:  (title, author, year) lowercased -> id (hash index for duplicate checks)
+    #   _ids:   sorted ids                         (offset and cursor paging)
+
+    def __init__(self):
+        self._books: dict[int, Row] = {}
+        self._keys: dict[tuple, int] = {}
+        self._ids: list[int] = []
+
+    @staticmethod
+    def _key(title: str, author: str, year: int | None) -> tuple | None:
+        # Only books with a year take part in duplicate checks
+        return None if year is None else (title.lower(), author.lower(), year)
+
+    def _add(self, row: Row) -> None:
+        self._books[row[0]] = row
+        key = self._key(*row[1:])
+        if key is not None:
+            self._keys.setdefault(key, row[0])
+        if not self._ids or row[0] > self._ids[-1]:
+            self._ids.append(row[0])
+        else:
+            bisect.insort(self._ids, row[0])
+
+    def _remove(self, book_id: int) -> None:
+        row = self._books.pop(book_id)
+        key = self._key(*row[1:])
+        if key is not None and self._keys.get(key) == book_id:
+            del self._keys[key]
+        del self._ids[bisect.bisect_left(self._ids, book_id)]
+
+    def load_snapshot(self, path: str) -> int:
+        # Copy every book from a books.db file
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT id, title, author, year FROM books ORDER BY id").fetchall()
+        finally:
+            conn.close()
+        for row in rows:
+            self._add(tuple(row))
+        return len(rows)
+
+    async def list_offset(self, limit: int, offset: int) -> list[Row]:
+        return [self._books[i] for i in self._ids[offset:offset + limit]]
+
+    async def list_after(self, last_id: int, limit: int) -> list[Row]:
+        start = bisect.bisect_right(self._ids, last_id)
+        return [self._books[i] for i in self._ids[start:start + limit]]
+
+    async def find(self, title: str | None, author: str | None, year: int | None) -> list[Row]:
+        if title and author and year is not None:
+            book_id = self._keys.get((title.lower(), author.lower(), year))
+            return [] if book_id is None else [self._books[book_id]]
+        return [
+            row for row in (self._books[i] for i in self._ids)
+            if (not title or row[1].lower() == title.lower())
+            and (not author or row[2].lower() == author.lower())
+            and (year is None or row[3] == year)
+        ]
+
+    async def insert(self, title: str, author: str, year: int | None) -> Row:
+        key = self._key(title, author, year)
+        if key is not None and key in self._keys:
+            raise HTTPException(status_code=409, detail="This book already exists.")
+        row = (self._ids[-1] + 1 if self._ids else 1, title, author, year)
+        self._add(row)
+        return row
+
+    async def update(self, book_id: int, values: dict) -> Row:
+        old = self._books.get(book_id)
+        if old is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        row = (book_id, values.get("title", old[1]), values.get("author", old[2]), values.get("year", old[3]))
+        key = self._key(*row[1:])
+        if key is not None and self._keys.get(key, book_id) != book_id:
+            raise HTTPException(status_code=409, detail="This book already exists.")
+        self._remove(book_id)
+        self._add(row)
+        return row
+
+    async def delete(self, book_id: int) -> None:
+        if book_id not in self._books:
+            raise HTTPException(status_code=404, detail="Book not found")
+        self._remove(book_id)
+
+    async def reset(self) -> None:
+        self._books.clear()
+        self._keys.clear()
+        self._ids.clear()
@@ -0,0 +1,141 @@
+import asyncio
+import collections
+import math
+import time
+
+# Admission control in front of the app. Every request belongs to a route class (reads,
+# writes, bulk) with its own concurrency limit and a bounded FIFO wait queue. A request is
+# turned away with 503 + Retry-After instead of being queued when the queue is full or its
+# expected wait is already past the deadline, and a queued request gives up at the deadline.
+# Work that is admitted finishes in bounded time, the excess fails fast and can retry.
+
+# Never limited, so the service stays observable under overload
+EXEMPT_PATHS = frozenset({"/healthcheck", "/metrics", "/cache/stats", "/admission/stats"})
+BULK_ROUTES = frozenset({("POST", "/books/bulk"), ("POST", "/imports"), ("GET", "/books/export")})
+
+
+def route_class(method: str, path: str) -> str | None:
+    if path in EXEMPT_PATHS:
+        return None
+    if (method, path) in BULK_ROUTES:
+        return "bulk"
+    if method in ("GET", "HEAD", "OPTIONS"):
+        return "reads"
+    return "writes"
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason # "queue_full" or "deadline"
+        self.retry_after = retry_after
+
+
+class Limiter:
+    def __init__(self, limit: int, max_queue: int, max_wait: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait # Seconds a request may spend queued
+        self.active = 0
+        self.admitted = 0
+        self.rejected: collections.Counter = collections.Counter()
+        self.service_time = 0.0 # Moving average of how long an admitted request holds its slot
+        self._waiters: collections.deque[asyncio.Future] = collections.deque()
+
+    def expected_wait(self, position: int) -> float:
+        # Slots free up at about limit / service_time per second
+        return (position + 1) * self.service_time / self.limit
+
+    def _reject(self, reason: str, wait: float) -> Rejected:
+        self.rejected[reason] += 1
+        return Rejected(reason, max(wait, self.service_time))
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        wait = self.expected_wait(len(self._waiters))
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full", wait)
+        if wait > self.max_wait:
+            raise self._reject("deadline", wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up, pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(exc, asyncio.CancelledError):
+                raise
+            raise self._reject("deadline", self.expected_wait(len(self._waiters))) from None
+        self.admitted += 1
+
+    def release(self, held: float | None = None) -> None:
+        if held is not None:
+            self.service_time = held if not self.service_time else 0.9 * self.service_time + 0.1 * held
+        # Hand the slot straight to the oldest waiter, so a newcomer can't overtake the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "max_wait": self.max_wait,
+            "in_flight": self.active,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected["queue_full"],
+            "rejected_deadline": self.rejected["deadline"],
+            "service_time": round(self.service_time, 6),
+        }
+
+
+class AdmissionMiddleware:
+    # Pure ASGI middleware, runs before routing so a rejected request costs almost nothing
+    def __init__(self, app, limiters: dict[str, Limiter], enabled: bool = True):
+        self.app = app
+        self.limiters = limiters
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        name = route_class(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if not self.enabled or name is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[name]
+        try:
+            await limiter.acquire()
+        except Rejected as exc:
+            await send_overloaded(send, exc)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - started)
+
+
+async def send_overloaded(send, exc: Rejected) -> None:
+    body = b'{"detail":"Server is overloaded, retry later"}'
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(exc.retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
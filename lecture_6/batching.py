@@ -0,0 +1,87 @@
+import asyncio
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+Operation = Callable[[AsyncConnection], Awaitable[object]]
+
+
+class WriteBatcher:
+    # Group commit: concurrent write operations are queued and applied in one transaction
+    # per window (max_batch operations or max_wait seconds, whichever comes first).
+    # Each operation is a single-statement write, so a constraint error only undoes that
+    # statement and the caller gets its own exception while the rest of the batch commits.
+
+    def __init__(self, engine: AsyncEngine, max_batch: int = 64, max_wait: float = 0.002, enabled: bool = False):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self.batches = 0
+        self.operations = 0
+        self._queue: list[tuple[Operation, asyncio.Future]] = []
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def submit(self, operation: Operation):
+        if not self.enabled:
+            async with self.engine.begin() as conn:
+                return await operation(conn)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((operation, future))
+        if len(self._queue) >= self.max_batch:
+            self._full.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return await future
+
+    async def _run(self) -> None:
+        while self._queue:
+            if len(self._queue) < self.max_batch:
+                # Give concurrent requests a short window to join this batch
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+            await self._apply(batch)
+        self._task = None
+
+    async def _apply(self, batch: list[tuple[Operation, asyncio.Future]]) -> None:
+        outcomes = []
+        try:
+            async with self.engine.begin() as conn:
+                for operation, future in batch:
+                    try:
+                        outcomes.append((future, await operation(conn), None))
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+        except Exception as exc:
+            # The commit itself failed, nothing from this batch was written
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        self.batches += 1
+        self.operations += len(batch)
+        for future, result, exc in outcomes:
+            if future.done():
+                continue
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_batch": self.max_batch,
+            "max_wait": self.max_wait,
+            "batches": self.batches,
+            "operations": self.operations,
+            "queued": len(self._queue),
+        }
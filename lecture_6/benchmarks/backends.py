@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Runs one scripted request sequence against every storage backend (BOOKS_STORAGE) and
+# checks that the responses match, then reports how long the sequence took on each.
+#   python benchmarks/backends.py                         # lecture_6
+#   python benchmarks/backends.py --app-dir ../lecture_5/book_api
+#
+# Differences that are allowed: full-text search ranks by bm25 on SQLite and by id in
+# memory, so those result lists are compared as sets.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKENDS = ["sqlite", "memory"]
+
+
+async def scenario(client, routes: set[tuple[str, str]]) -> list:
+    # (request, status, body) for every step; bodies are parsed JSON or text
+    log = []
+
+    async def call(method: str, url: str, sort_items: bool = False, **kwargs):
+        response = await client.request(method, url, **kwargs)
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        if sort_items and isinstance(body, dict) and "items" in body:
+            body["items"] = sorted(body["items"], key=lambda b: b["id"])
+        log.append((method, url, kwargs.get("params"), response.status_code, body))
+        return response
+
+    await call("POST", "/setup_database")
+    authors = ["Tolstoy", "Austen", "Orwell", "Dickens"]
+    for n in range(60):
+        year = None if n % 7 == 0 else 1800 + n * 3
+        await call("POST", "/books", json={"title": f"Book {n} of War", "author": authors[n % 4], "year": year})
+    await call("POST", "/books", json={"title": "book 1 OF war", "author": "austen", "year": 1803}) # duplicate
+    await call("POST", "/books", json={"title": "Book 7 of War", "author": "Austen", "year": None}) # no year, allowed
+    await call("POST", "/books", json={"title": "", "author": "X"}) # invalid
+
+    for offset in (0, 10, 55, 100):
+        await call("GET", "/books", params={"limit": 10, "offset": offset})
+    cursor = ""
+    while cursor is not None:
+        response = await call("GET", "/books", params={"limit": 25, "after": cursor})
+        cursor = response.json()["next_cursor"]
+    await call("GET", "/books", params={"after": "not-a-cursor"})
+
+    for book_id in (1, 30, 999):
+        await call("GET", f"/books/{book_id}")
+    for params in ({"author": "AUSTEN"}, {"title": "book 2 of war"}, {"author": "Orwell", "year": 1806},
+                   {"title": "Book 5 of War", "author": "Austen", "year": 1815}, {"year": 1803}, {"author": "Nobody"}):
+        await call("GET", "/books/search", params=params)
+
+    await call("PUT", "/books/2", params={"year": 2000})
+    await call("PUT", "/books/3", params={"title": "Book 1 of War", "author": "Austen", "year": 2000}) # conflict
+    await call("PUT", "/books/999", params={"year": 1})
+    await call("PUT", "/books/4")
+    await call("DELETE", "/books/5")
+    await call("DELETE", "/books/5")
+    await call("GET", "/books", params={"limit": 5, "offset": 0})
+
+    if ("PATCH", "/books/{book_id}") in routes:
+        await call("PATCH", "/books/6", json={"year": None})
+        await call("PATCH", "/books/6", json={"author": "Woolf"})
+        await call("PATCH", "/books/8", json={})
+    if ("POST", "/books/bulk") in routes:
+        records = [{"title": f"Bulk {n}", "author": "Kafka", "year": 1900 + n} for n in range(5)]
+        records += [records[0], {"title": "Book 9 of War", "author": "Austen", "year": 1827}, {"author": "no title"}]
+        await call("POST", "/books/bulk", json=records)
+    if ("GET", "/books/search?q") in routes:
+        await call("GET", "/books/search", sort_items=True, params={"q": "war"})
+        await call("GET", "/books/search", sort_items=True, params={"q": "boo 1", "limit": 100})
+        await call("GET", "/books/search", sort_items=True, params={"q": "kaf", "year": 1902})
+        await call("GET", "/books/search", params={"q": "!!"})
+    if ("GET", "/books/search?fuzzy") in routes:
+        await call("GET", "/books/search", params={"q": "tolstoi", "fuzzy": "true"})
+        await call("GET", "/books/search", params={"q": "kafk bulk", "fuzzy": "true", "limit": 3})
+        await call("GET", "/books/search", params={"q": "orwel war", "fuzzy": "true", "year": 1830})
+        await call("GET", "/books/search", params={"q": "orwel", "fuzzy": "true", "threshold": 0.9})
+    if ("GET", "/books/stats") in routes:
+        await call("GET", "/books/stats")
+    if ("GET", "/books/export") in routes:
+        await call("GET", "/books/export")
+        await call("GET", "/books/export", params={"format": "csv"})
+    return log
+
+
+async def run(backend: str, app_dir: str, rounds: int) -> dict:
+    import httpx
+
+    sys.path.insert(0, app_dir)
+    import main
+
+    # Steps for endpoints the app doesn't have are skipped, so lecture_5 runs the common part
+    routes = set()
+    for route in main.app.routes:
+        for method in getattr(route, "methods", ()):
+            routes.add((method, route.path))
+            dependant = getattr(route, "dependant", None)
+            for param in getattr(dependant, "query_params", ()):
+                if param.name in ("q", "fuzzy"):
+                    routes.add((method, f"{route.path}?{param.name}"))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://backends") as client:
+            started = time.perf_counter()
+            for _ in range(rounds):
+                log = await scenario(client, routes)
+            elapsed = time.perf_counter() - started
+    return {"backend": backend, "seconds": round(elapsed, 3), "steps": len(log), "log": log}
+
+
+def run_backend(backend: str, args) -> dict:
+    # Backend is chosen when main is imported, so each one runs in a fresh interpreter
+    env = dict(os.environ)
+    env["BOOKS_STORAGE"] = backend
+    env["BOOKS_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "books.db")
+    env.pop("BOOKS_SNAPSHOT", None)
+    command = [sys.executable, __file__, "--backend", backend, "--app-dir", args.app_dir,
+               "--rounds", str(args.rounds), "--json"]
+    output = subprocess.run(command, env=env, cwd=os.path.dirname(env["BOOKS_DB_PATH"]),
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Storage backend contract check and timing")
+    parser.add_argument("--app-dir", default=os.path.join(HERE, ".."))
+    parser.add_argument("--rounds", type=int, default=5, help="times the sequence is repeated for timing")
+    parser.add_argument("--backend", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.app_dir = os.path.abspath(args.app_dir)
+
+    if args.json:
+        print(json.dumps(asyncio.run(run(args.backend, args.app_dir, args.rounds))))
+        sys.exit(0)
+
+    results = [run_backend(backend, args) for backend in BACKENDS]
+    reference = results[0]
+    failures = 0
+    for result in results[1:]:
+        for expected, actual in zip(reference["log"], result["log"]):
+            if expected != actual:
+                failures += 1
+                print(f"MISMATCH {result['backend']}: {expected[:3]}\n  {reference['backend']}: {expected[3:]}\n"
+                      f"  {result['backend']}: {actual[3:]}")
+        if len(reference["log"]) != len(result["log"]):
+            failures += 1
+            print(f"MISMATCH {result['backend']}: {len(result['log'])} steps, expected {len(reference['log'])}")
+    for result in results:
+        print(f"{result['backend']:>7}: {result['steps']} requests x {args.rounds} rounds in {result['seconds']}s")
+    print("backends agree" if not failures else f"{failures} mismatches")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+# Fires concurrent writes and reads at the app in-process and counts failures.
+# A second connection keeps long read transactions open meanwhile, like a report or
+# backup running next to the API — with a rollback journal that blocks every commit.
+# Run once per engine profile to compare:
+#   python benchmarks/check_concurrency.py --profile default
+#   python benchmarks/check_concurrency.py --profile production
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+async def worker(client, worker_id: int, requests: int, counts: Counter) -> None:
+    rng = random.Random(worker_id)
+    for n in range(requests):
+        action = rng.random()
+        try:
+            if action < 0.3:
+                response = await client.post("/books", json={
+                    "title": f"Book {worker_id}-{n}", "author": f"Author {worker_id}", "year": 2000 + n,
+                })
+            elif action < 0.5:
+                # Bulk requests read and write in one transaction
+                response = await client.post("/books/bulk", json=[
+                    {"title": f"Bulk {worker_id}-{n}-{i}", "author": "Bulk", "year": i} for i in range(5)
+                ])
+            elif action < 0.7:
+                response = await client.put(f"/books/{rng.randint(1, 50)}", params={"year": rng.randint(1, 3000)})
+            else:
+                response = await client.get("/books", params={"after": "", "limit": 20})
+            counts[response.status_code] += 1
+        except Exception as exc:
+            # Unhandled errors inside the app are re-raised by the ASGI transport
+            counts["locked" if "locked" in str(exc) else type(exc).__name__] += 1
+
+
+def long_reader(path: str, hold: float, stop: threading.Event) -> None:
+    conn = sqlite3.connect(path, isolation_level=None)
+    while not stop.is_set():
+        try:
+            conn.execute("BEGIN")
+            conn.execute("SELECT COUNT(*) FROM books").fetchone()
+            stop.wait(hold)
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+    conn.close()
+
+
+async def run(workers: int, requests: int, hold: float) -> None:
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        await client.post("/setup_database")
+        stop = threading.Event()
+        reader = threading.Thread(target=long_reader, args=(main.DATABASE_PATH, hold, stop))
+        if hold > 0:
+            reader.start()
+
+        counts = Counter()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client, i, requests, counts) for i in range(workers)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        if reader.is_alive():
+            reader.join()
+    await main.dispose_engines()
+
+    total = workers * requests
+    print(f"profile={main.ENGINE_PROFILE} requests={total} time={elapsed:.2f}s rps={total / elapsed:.0f}")
+    print(f"locked errors: {counts.pop('locked', 0)}")
+    print("responses:", dict(sorted(counts.items(), key=str)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent write check for the book API")
+    parser.add_argument("--profile", choices=["default", "production"], default="production")
+    parser.add_argument("--workers", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--hold", type=float, default=6.0, help="seconds each long read transaction stays open")
+    args = parser.parse_args()
+
+    # The engine is configured on import, so the environment has to be set first
+    os.environ["BOOKS_ENGINE_PROFILE"] = args.profile
+    os.environ["BOOKS_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "books.db")
+    os.environ["BOOKS_CACHE_ENABLED"] = "0"
+    asyncio.run(run(args.workers, args.requests, args.hold))
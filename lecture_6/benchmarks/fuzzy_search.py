@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Latency of fuzzy search (GET /books/search?q=...&fuzzy=true) on a large catalog.
+#   python benchmarks/fuzzy_search.py --size 1000000 --authors 100000 --budget-ms 10
+#
+# The catalog gets --authors distinct made-up surnames, so the vocabulary the trigram index
+# works on is realistically large. Queries are misspelled surnames and title words; the
+# response cache is off, so every query runs. Exit code 1 when the p99 of the search itself
+# (without the HTTP stack, reported separately) is over the budget.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+SYLLABLES = ["ka", "to", "ri", "sto", "lo", "ma", "ne", "vi", "an", "er", "in", "ov", "sky", "ber", "gen",
+             "mur", "dal", "wen", "ford", "ley", "ton", "sen", "ski", "ich", "ard", "ul", "ha", "be", "cor"]
+
+
+def surname(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+
+
+def misspell(rng: random.Random, word: str) -> str:
+    # One substituted, dropped or doubled letter
+    i = rng.randrange(1, len(word))
+    kind = rng.choice(["sub", "drop", "double"])
+    if kind == "sub":
+        return word[:i] + rng.choice("aeiouy") + word[i + 1:]
+    if kind == "drop":
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i] + word[i:]
+
+
+def seed(path: str, size: int, authors: int, seed_value: int) -> list[str]:
+    from sqlalchemy import create_engine
+    import main
+    from load_test import NAMES, make_book
+
+    if os.path.exists(path):
+        os.remove(path)
+    sync_engine = create_engine(f"sqlite:///{path}")
+    with sync_engine.begin() as conn:
+        main.migrate_schema(conn)
+    sync_engine.dispose()
+
+    rng = random.Random(seed_value)
+    names = sorted({surname(rng) for _ in range(authors)})
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+
+    def rows():
+        for n in range(size):
+            title, _, year = make_book(rng, n)
+            author = f"{rng.choice(NAMES)} {rng.choice(names)}"
+            yield title, author, year, main.normalize_key(title), main.normalize_key(author)
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO books (title, author, year, title_key, author_key) VALUES (?, ?, ?, ?, ?)", rows()
+        )
+    conn.close()
+    return names
+
+
+async def run(args, names: list[str]) -> dict:
+    import httpx
+    import main
+    from load_test import WORDS, percentile
+
+    rng = random.Random(args.seed)
+    queries = []
+    for _ in range(args.queries):
+        words = [misspell(rng, rng.choice(names).lower())]
+        if rng.random() < 0.3:
+            words.append(misspell(rng, rng.choice(WORDS)))
+        queries.append(" ".join(words))
+
+    transport = httpx.ASGITransport(app=main.app)
+    search, http = [], []
+    found = 0
+    async with main.app.router.lifespan_context(main.app):
+        # The search itself: vocabulary lookups, the FTS5 query and ranking
+        for query in queries:
+            async with main.open_repository() as repo:
+                started = time.perf_counter()
+                result = await main.search_books_fuzzy(repo, query, None, 10, main.FUZZY_THRESHOLD)
+                search.append(time.perf_counter() - started)
+            found += bool(result["items"])
+        # The same queries as requests, adds routing, validation and serialization
+        async with httpx.AsyncClient(transport=transport, base_url="http://fuzzy") as client:
+            for query in queries:
+                started = time.perf_counter()
+                response = await client.get("/books/search", params={"q": query, "fuzzy": "true", "limit": 10})
+                http.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+    report = {
+        "size": args.size,
+        "vocabulary": len(main.vocabulary) if main.STORAGE_BACKEND == "sqlite" else None,
+        "queries": len(queries),
+        "with_results": found,
+        "startup_ms": {phase: round(seconds * 1000, 1) for phase, seconds in main.startup_timings.items()},
+    }
+    for name, samples in (("search", search), ("http", http)):
+        for q in (0.50, 0.95, 0.99):
+            report[f"{name}_p{int(q * 100)}_ms"] = round(percentile(samples, q) * 1000, 3)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fuzzy search latency")
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--authors", type=int, default=50000, help="distinct surnames in the catalog")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("BOOKS_FUZZY_BUDGET_MS", "10")))
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "books-fuzzy.db"))
+    args = parser.parse_args()
+
+    os.environ["BOOKS_DB_PATH"] = args.db # Read when main is imported
+    os.environ["BOOKS_CACHE_ENABLED"] = "0"
+    os.environ["BOOKS_ADMISSION_ENABLED"] = "0"
+    started = time.perf_counter()
+    names = seed(args.db, args.size, args.authors, args.seed)
+    print(f"seeded {args.size} books in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    report = asyncio.run(run(args, names))
+    report["budget_ms"] = args.budget_ms
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if report["search_p99_ms"] > args.budget_ms else 0)
@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+# Load test for the book API: seeds books.db at a given size, runs a mixed read/write
+# scenario and reports p50/p95/p99 latency and throughput per endpoint as JSON.
+#
+# In-process (ASGI transport, one fresh database per size):
+#   python benchmarks/load_test.py --sizes 1000,100000 --scenario mixed --output report.json
+# Against a running server (seed the file first, then start uvicorn on it):
+#   python benchmarks/load_test.py --seed-only --size 100000 --data-dir bench-data
+#   BOOKS_DB_PATH=bench-data/books-100000.db uvicorn main:app --port 8000
+#   python benchmarks/load_test.py --url http://127.0.0.1:8000 --size 100000
+# Comparing against a stored run:
+#   python benchmarks/load_test.py --size 1000 --baseline baseline.json --tolerance 0.2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+WORDS = ["war", "peace", "night", "river", "house", "garden", "winter", "stone", "king", "sea",
+         "letters", "journey", "shadow", "light", "city", "forest", "island", "storm", "memory", "song"]
+NAMES = ["Tolstoy", "Austen", "Orwell", "Dickens", "Twain", "Woolf", "Chekhov", "Bronte", "Hugo", "Kafka"]
+
+# Weighted operations per scenario
+SCENARIOS = {
+    "read-heavy": {"list": 35, "list-cursor": 20, "search": 15, "search-fts": 15, "get": 10, "create": 3, "update": 1, "delete": 1},
+    "mixed": {"list": 20, "list-cursor": 15, "search": 10, "search-fts": 10, "get": 10, "create": 20, "update": 10, "delete": 5},
+    "write-heavy": {"list": 10, "search-fts": 5, "get": 5, "create": 50, "update": 20, "delete": 10},
+}
+
+
+def make_book(rng: random.Random, n: int) -> tuple:
+    title = " ".join(rng.sample(WORDS, 3)).title()[:45] + f" {n}"
+    return title, rng.choice(NAMES), rng.randint(1800, 2025)
+
+
+def seed_database(path: str, size: int, seed: int = 42) -> None:
+    # Schema comes from main so indexes and FTS triggers match the service
+    from sqlalchemy import create_engine
+    import main
+
+    if os.path.exists(path):
+        os.remove(path)
+    sync_engine = create_engine(f"sqlite:///{path}")
+    with sync_engine.begin() as conn:
+        main.migrate_schema(conn)
+    sync_engine.dispose()
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    rows = ((t, a, y, main.normalize_key(t), main.normalize_key(a)) for t, a, y in (make_book(rng, n) for n in range(size)))
+    with conn:
+        conn.executemany(
+            "INSERT INTO books (title, author, year, title_key, author_key) VALUES (?, ?, ?, ?, ?)", rows
+        )
+    conn.close()
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Workload:
+    def __init__(self, client, size: int, rng: random.Random):
+        self.client = client
+        self.size = size
+        self.rng = rng
+        self.created = 0
+
+    def book_id(self) -> int:
+        return self.rng.randint(1, self.size)
+
+    async def request(self, op: str):
+        rng = self.rng
+        if op == "list":
+            return await self.client.get("/books", params={"limit": 20, "offset": rng.randint(0, max(self.size - 20, 0))})
+        if op == "list-cursor":
+            return await self.client.get("/books", params={"limit": 20, "after": ""})
+        if op == "search":
+            return await self.client.get("/books/search", params={"author": rng.choice(NAMES), "year": rng.randint(1800, 2025)})
+        if op == "search-fts":
+            return await self.client.get("/books/search", params={"q": f"{rng.choice(WORDS)} {rng.choice(WORDS)[:3]}", "limit": 20})
+        if op == "get":
+            return await self.client.get(f"/books/{self.book_id()}")
+        if op == "create":
+            self.created += 1
+            title, author, year = make_book(rng, self.size + self.created)
+            return await self.client.post("/books", json={"title": f"{title} new", "author": author, "year": year})
+        if op == "update":
+            return await self.client.put(f"/books/{self.book_id()}", params={"year": rng.randint(1800, 2025)})
+        if op == "delete":
+            return await self.client.delete(f"/books/{self.book_id()}")
+        raise ValueError(op)
+
+
+async def run_scenario(client, size: int, scenario: str, concurrency: int, requests: int, seed: int) -> dict:
+    ops, weights = zip(*SCENARIOS[scenario].items())
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+
+    async def user(user_id: int):
+        workload = Workload(client, size, random.Random(seed * 1000 + user_id))
+        for _ in range(requests // concurrency):
+            op = workload.rng.choices(ops, weights)[0]
+            started = time.perf_counter()
+            response = await workload.request(op)
+            latencies[op].append(time.perf_counter() - started)
+            statuses[op][response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(v) for v in latencies.values())
+    everything = [x for v in latencies.values() for x in v]
+    endpoints = {
+        op: {
+            "count": len(samples),
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+            "statuses": {str(k): v for k, v in sorted(statuses[op].items())},
+        }
+        for op, samples in sorted(latencies.items())
+    }
+    return {
+        "size": size,
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": total,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(everything, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(everything, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(everything, 0.99) * 1000, 3),
+        "endpoints": endpoints,
+    }
+
+
+async def run_in_process(args) -> dict:
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        report = await run_scenario(client, args.size, args.scenario, args.concurrency, args.requests, args.seed)
+    await main.dispose_engines()
+    report["target"] = "asgi"
+    return report
+
+
+async def run_against_url(args) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        report = await run_scenario(client, args.size, args.scenario, args.concurrency, args.requests, args.seed)
+    report["target"] = args.url
+    return report
+
+
+def compare(reports: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    # A run regresses when p95 latency or throughput is worse than the baseline by more than tolerance
+    regressions = []
+    previous = {(r["size"], r["scenario"]): r for r in baseline}
+    for report in reports:
+        base = previous.get((report["size"], report["scenario"]))
+        if base is None:
+            continue
+        name = f"size={report['size']} scenario={report['scenario']}"
+        if report["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {report['p95_ms']}ms")
+        if report["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput_rps']} -> {report['throughput_rps']} rps")
+    return regressions
+
+
+def run_size(size: int, args) -> dict:
+    # Engine settings are read on import, so every in-process size runs in a fresh interpreter
+    env = dict(os.environ)
+    env["BOOKS_DB_PATH"] = os.path.join(args.data_dir, f"books-{size}.db")
+    command = [sys.executable, __file__, "--size", str(size), "--scenario", args.scenario,
+               "--concurrency", str(args.concurrency), "--requests", str(args.requests),
+               "--seed", str(args.seed), "--data-dir", args.data_dir, "--single"]
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Book API load test")
+    parser.add_argument("--sizes", default="1000", help="comma separated catalog sizes, e.g. 1000,100000,1000000")
+    parser.add_argument("--size", type=int, help="single catalog size")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=tempfile.gettempdir())
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--seed-only", action="store_true", help="only create the seeded database file")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [args.size] if args.size else [int(s) for s in args.sizes.split(",")]
+
+    if args.single:
+        # Child process: seed the database chosen by the parent and run in-process
+        seed_database(os.environ["BOOKS_DB_PATH"], args.size, args.seed)
+        print(json.dumps(asyncio.run(run_in_process(args))))
+        return 0
+
+    if args.seed_only:
+        for size in sizes:
+            path = os.path.join(args.data_dir, f"books-{size}.db")
+            started = time.perf_counter()
+            seed_database(path, size, args.seed)
+            print(f"seeded {path} with {size} books in {time.perf_counter() - started:.1f}s")
+        return 0
+
+    reports = []
+    for size in sizes:
+        if args.url:
+            args.size = size
+            reports.append(asyncio.run(run_against_url(args)))
+        else:
+            reports.append(run_size(size, args))
+
+    text = json.dumps(reports, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(reports, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
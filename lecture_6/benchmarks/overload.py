@@ -0,0 +1,148 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+# Behaviour under overload with and without admission control (BOOKS_ADMISSION_ENABLED).
+#   python benchmarks/overload.py --clients 4 --concurrency 64 --seconds 10
+#
+# Far more connections than the server can serve hammer the read-heavy mix for a fixed time.
+# Reported per run: goodput (2xx-4xx answers per second), latency of those answers, how many
+# were shed with 503, how many timed out on the client and how many failed (5xx other than
+# 503, dropped connections). With admission control the answered requests should keep a
+# bounded p99 while the excess gets fast 503s.
+#
+# The client side latency includes time spent in the load generator itself, which on a small
+# machine shares the CPU with the server. server_p50_ms/server_p99_ms come from the server's
+# own request histogram (/metrics, upper bucket bound) and show what the server delivers.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "..")
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, HERE)
+
+
+async def client_loop(url: str, size: int, concurrency: int, seconds: float, timeout: float, seed: int) -> dict:
+    import httpx
+
+    from load_test import SCENARIOS, Workload
+
+    ops, weights = zip(*SCENARIOS["read-heavy"].items())
+    latencies, shed, timeouts, errors = [], 0, 0, 0
+    deadline = time.monotonic() + seconds
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        async def user(user_id: int):
+            nonlocal shed, timeouts, errors
+            workload = Workload(client, size, random.Random(seed * 1000 + user_id))
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await workload.request(workload.rng.choices(ops, weights)[0])
+                except httpx.TimeoutException:
+                    timeouts += 1
+                    continue
+                except httpx.TransportError:
+                    errors += 1 # Connection dropped by the overloaded server
+                    continue
+                if response.status_code == 503:
+                    shed += 1
+                    # Well-behaved clients back off instead of retrying at once
+                    await asyncio.sleep(min(float(response.headers.get("retry-after", "1")), 0.5))
+                elif response.status_code >= 500:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return {"latencies": latencies, "shed": shed, "timeouts": timeouts, "errors": errors}
+
+
+def run_client(args: tuple) -> dict:
+    return asyncio.run(client_loop(*args))
+
+
+def server_latency(url: str) -> dict:
+    # Quantiles of answered requests from the http_request_duration_seconds buckets
+    import httpx
+
+    buckets: dict[float, int] = {}
+    for line in httpx.get(f"{url}/metrics", timeout=30).text.splitlines():
+        if not line.startswith("http_request_duration_seconds_bucket") or 'route="/metrics"' in line:
+            continue
+        labels, value = line.rsplit(" ", 1)
+        status = int(labels.split('status="')[1].split('"')[0])
+        if status < 500:
+            le = labels.split('le="')[1].split('"')[0]
+            bound = float("inf") if le == "+Inf" else float(le)
+            buckets[bound] = buckets.get(bound, 0) + int(float(value))
+    total = buckets.get(float("inf"), 0)
+    report = {}
+    for name, q in (("server_p50_ms", 0.5), ("server_p99_ms", 0.99)):
+        bound = next((b for b in sorted(buckets) if total and buckets[b] >= q * total), None)
+        report[name] = None if bound is None else bound * 1000
+    return report
+
+
+def measure(admission: bool, args) -> dict:
+    from load_test import percentile
+    from workers import wait_ready
+
+    env = dict(os.environ)
+    env["BOOKS_DB_PATH"] = args.db
+    env["BOOKS_CACHE_ENABLED"] = "0" # Every request reaches the database
+    env["BOOKS_ADMISSION_ENABLED"] = "1" if admission else "0"
+    url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "main.py", "serve", "--port", str(args.port), "--workers", "1"],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(url)
+        jobs = [(url, args.size, args.concurrency, args.seconds, args.timeout, args.seed + i)
+                for i in range(args.clients)]
+        with Pool(args.clients) as pool:
+            parts = pool.map(run_client, jobs)
+        server_side = server_latency(url)
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = [x for part in parts for x in part["latencies"]]
+    report = {
+        "admission": admission,
+        "answered": len(latencies),
+        "goodput_rps": round(len(latencies) / args.seconds, 1),
+        "shed_503": sum(part["shed"] for part in parts),
+        "client_timeouts": sum(part["timeouts"] for part in parts),
+        "failed": sum(part["errors"] for part in parts),
+    }
+    if latencies:
+        for name, q in (("p50_ms", 0.5), ("p99_ms", 0.99), ("max_ms", 1.0)):
+            report[name] = round(percentile(latencies, q) * 1000, 1)
+    report.update(server_side)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tail latency under overload, admission control on and off")
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=64, help="connections per client process")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=5, help="client timeout per request")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "books-overload.db"))
+    args = parser.parse_args()
+
+    from load_test import seed_database
+
+    seed_database(args.db, args.size, args.seed)
+    print(json.dumps([measure(False, args), measure(True, args)], indent=2))
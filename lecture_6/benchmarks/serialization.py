@@ -0,0 +1,48 @@
+import argparse
+import os
+import sys
+import timeit
+
+# Serialization cost of one page of books, old path vs the pre-rendered path.
+#   python benchmarks/serialization.py --rows 100
+#
+# before: ORM rows -> BookSchema per row -> jsonable_encoder -> JSONResponse
+# after:  column tuples -> dicts -> dump_json (orjson when installed) -> raw Response
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import main
+
+
+def make_rows(count: int) -> list[tuple]:
+    return [(i, f"Some Book Title {i}", f"Author {i % 50}", 1900 + i % 120) for i in range(1, count + 1)]
+
+
+def before(models: list) -> bytes:
+    books = [main.BookSchema(id=b.id, title=b.title, author=b.author, year=b.year) for b in models]
+    return JSONResponse(jsonable_encoder(books)).body
+
+
+def after(rows: list[tuple]) -> bytes:
+    return main.json_response(main.dump_json([main.book_dict(r) for r in rows])).body
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Page serialization microbenchmark")
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    models = [main.BookModel(id=i, title=t, author=a, year=y) for i, t, a, y in rows]
+    assert before(models) == after(rows), "both paths must produce the same body"
+
+    old = min(timeit.repeat(lambda: before(models), number=args.number, repeat=5)) / args.number
+    new = min(timeit.repeat(lambda: after(rows), number=args.number, repeat=5)) / args.number
+    print(f"encoder: {'orjson' if main.orjson is not None else 'json'}, rows per page: {args.rows}")
+    print(f"before: {old * 1e6:9.1f} us/page")
+    print(f"after:  {new * 1e6:9.1f} us/page")
+    print(f"speedup: {old / new:.1f}x")
@@ -0,0 +1,65 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Import + startup time budget for one worker process. Exits 1 when over budget, so CI
+# can run it next to the load test; autoscaling depends on how fast a new worker is ready.
+#   python benchmarks/startup_budget.py --budget-ms 1500 --size 10000
+#
+# Every run is a fresh interpreter, the budget is checked against the median of --runs.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "..")
+
+CHILD = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def start():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(start())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "total_ms": (ready - started) * 1000,
+    "phases_ms": {k: v * 1000 for k, v in main.startup_timings.items()},
+}))
+"""
+
+
+def measure_once(db_path: str) -> dict:
+    env = dict(os.environ)
+    env["BOOKS_DB_PATH"] = db_path
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=APP_DIR, env=env,
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker import + startup time budget")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("BOOKS_STARTUP_BUDGET_MS", "2000")))
+    parser.add_argument("--size", type=int, default=1000, help="books in the seeded database")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, HERE)
+    sys.path.insert(0, APP_DIR)
+    from load_test import seed_database
+
+    db_path = os.path.join(tempfile.mkdtemp(), "books.db")
+    seed_database(db_path, args.size)
+    runs = sorted((measure_once(db_path) for _ in range(args.runs)), key=lambda r: r["total_ms"])
+    median = runs[len(runs) // 2]
+
+    print(json.dumps({"budget_ms": args.budget_ms, "median": median,
+                      "runs_total_ms": [round(r["total_ms"], 1) for r in runs]}, indent=2))
+    if median["total_ms"] > args.budget_ms:
+        print(f"OVER BUDGET: {median['total_ms']:.0f} ms > {args.budget_ms:.0f} ms", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,108 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+# Read throughput of `python main.py serve` with 1..N worker processes on one books.db.
+#   python benchmarks/workers.py --workers 1,2,4 --size 10000
+#
+# Each client process runs its own event loop, so the load generator is not the bottleneck.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "..")
+sys.path.insert(0, APP_DIR)
+
+
+async def client_loop(url: str, size: int, concurrency: int, requests: int, seed: int) -> int:
+    import random
+
+    import httpx
+
+    from load_test import Workload
+
+    done = 0
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        async def user(user_id: int):
+            nonlocal done
+            workload = Workload(client, size, random.Random(seed * 1000 + user_id))
+            for _ in range(requests // concurrency):
+                op = workload.rng.choice(["list", "search", "search-fts", "get"])
+                response = await workload.request(op)
+                # Structured search answers 404 when nothing matches
+                if response.status_code >= 500:
+                    raise RuntimeError(f"{op}: HTTP {response.status_code}")
+                done += 1
+
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return done
+
+
+def run_client(args: tuple) -> int:
+    return asyncio.run(client_loop(*args))
+
+
+def wait_ready(url: str, timeout: float = 30) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/healthcheck", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+
+def measure(workers: int, args) -> dict:
+    env = dict(os.environ)
+    env["BOOKS_DB_PATH"] = args.db
+    # Measure raw worker scaling, not the per-process response cache
+    env["BOOKS_CACHE_ENABLED"] = "0"
+    url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "main.py", "serve", "--port", str(args.port), "--workers", str(workers)],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(url)
+        jobs = [(url, args.size, args.concurrency, args.requests, args.seed + i) for i in range(args.clients)]
+        started = time.perf_counter()
+        with Pool(args.clients) as pool:
+            total = sum(pool.map(run_client, jobs))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+    return {"workers": workers, "requests": total, "seconds": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-worker read throughput")
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client process")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per client process")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "books-workers.db"))
+    args = parser.parse_args()
+
+    sys.path.insert(0, HERE)
+    from load_test import seed_database
+
+    seed_database(args.db, args.size, args.seed)
+    results = [measure(int(n), args) for n in args.workers.split(",")]
+    base = results[0]["throughput_rps"]
+    for result in results:
+        result["scaling"] = round(result["throughput_rps"] / base, 2)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+# Writes/sec for concurrent POST/PUT/DELETE with group commit off and on.
+#   python benchmarks/write_batching.py                 # runs both modes and compares
+#   python benchmarks/write_batching.py --mode on --clients 200
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+async def client_loop(client, client_id: int, requests: int, counts: Counter) -> None:
+    for n in range(requests):
+        if n % 10 == 9:
+            # Re-post an earlier book — must come back as this caller's own 409
+            response = await client.post("/books", json={"title": f"B{client_id}-0", "author": "A", "year": 1})
+        elif n % 5 == 4:
+            response = await client.put(f"/books/{client_id * requests + n}", params={"year": n})
+        elif n % 7 == 6:
+            response = await client.delete(f"/books/{client_id * requests + n}")
+        else:
+            response = await client.post("/books", json={"title": f"B{client_id}-{n}", "author": "A", "year": 1})
+        counts[response.status_code] += 1
+
+
+async def run(clients: int, requests: int) -> dict:
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/setup_database")
+        counts = Counter()
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, i, requests, counts) for i in range(clients)))
+        elapsed = time.perf_counter() - started
+    await main.dispose_engines()
+
+    total = clients * requests
+    return {
+        "batching": main.write_batcher.enabled,
+        "synchronous": main.SQLITE_PRAGMAS["synchronous"],
+        "writes": total,
+        "seconds": round(elapsed, 3),
+        "writes_per_sec": round(total / elapsed, 1),
+        "statuses": {str(k): v for k, v in sorted(counts.items())},
+        "batches": main.write_batcher.batches,
+    }
+
+
+def run_mode(mode: str, args) -> dict:
+    # Settings are read when main is imported, so each mode gets a fresh interpreter
+    env = dict(os.environ)
+    env["BOOKS_WRITE_BATCHING"] = "1" if mode == "on" else "0"
+    env["BOOKS_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "books.db")
+    env["BOOKS_SYNCHRONOUS"] = args.synchronous
+    command = [sys.executable, __file__, "--mode", mode, "--clients", str(args.clients),
+               "--requests", str(args.requests), "--json"]
+    output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Group commit benchmark")
+    parser.add_argument("--mode", choices=["on", "off", "both"], default="both")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--synchronous", default="FULL", help="PRAGMA synchronous, FULL makes every commit fsync")
+    parser.add_argument("--json", action="store_true", help="print the raw result of a single mode")
+    args = parser.parse_args()
+
+    if args.json:
+        print(json.dumps(asyncio.run(run(args.clients, args.requests))))
+    else:
+        modes = ["off", "on"] if args.mode == "both" else [args.mode]
+        results = {mode: run_mode(mode, args) for mode in modes}
+        for mode, result in results.items():
+            print(f"batching {mode:>3}: {result['writes_per_sec']:>8} writes/s  "
+                  f"{result['batches']} batches  statuses {result['statuses']}")
+        if len(results) == 2:
+            print(f"speedup: {results['on']['writes_per_sec'] / results['off']['writes_per_sec']:.2f}x")
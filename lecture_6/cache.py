@@ -0,0 +1,84 @@
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class ResponseCache:
+    # In-process LRU cache with TTL for read endpoints.
+    # List/search entries are tied to the write generation and go stale after any write,
+    # by-id entries are dropped one by one when that book changes.
+    # version mirrors the catalog version row in the database; when it moves without a local
+    # write explaining it (another worker or process wrote), everything is dropped.
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0, enabled: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.enabled = enabled
+        self.generation = 0 # Bumped on every write
+        self.version: int | None = None # Last catalog version seen
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[float, int | None, object]] = OrderedDict()
+
+    def get(self, key: Hashable) -> object | None:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, generation, value = entry
+            if expires_at > time.monotonic() and (generation is None or generation == self.generation):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: object, generation: int, by_id: bool = False) -> None:
+        # generation is the value read before the query; a write in between makes the result unsafe to keep
+        if not self.enabled or generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, None if by_id else generation, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable | None = None, version: int | None = None, changed: int = 1) -> None:
+        # Drop one by-id entry (if given) and expire every list/search entry.
+        # version is the catalog version right after this write, changed = rows it touched.
+        if key is not None:
+            self._entries.pop(key, None)
+        self.generation += 1
+        if version is not None and self.version is not None:
+            if version - changed == self.version:
+                self.version = version
+            elif version != self.version:
+                # Someone else wrote in between, by-id entries can't be trusted either
+                self.clear()
+
+    def observe_version(self, version: int) -> None:
+        # Called with the catalog version read on each request
+        if version != self.version:
+            if self.version is not None:
+                self.clear()
+            self.version = version
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.generation += 1
+        self.version = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "generation": self.generation,
+            "version": -1 if self.version is None else self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
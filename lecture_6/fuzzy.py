@@ -0,0 +1,120 @@
+import math
+from collections import Counter
+
+# Typo-tolerant word lookup. The index holds the distinct words of titles and authors (the
+# vocabulary, much smaller than the catalog) split into trigrams, pg_trgm style: "tolstoi" is
+# padded to "  tolstoi " and cut into "  t", " to", "tol", ..., "oi ". Similarity is
+# shared / (all distinct) trigrams, so "tolstoi" vs "tolstoy" = 6 / 10.
+# A lookup only touches the posting lists of the query's trigrams, never the whole vocabulary.
+
+STRICT_THRESHOLD = 0.6 # First pass of a lookup, see TrigramIndex.similar
+
+
+def indexable(word: str) -> bool:
+    # Words under three letters and words starting with a digit (numbers, "2nd") only ever
+    # match exactly
+    return len(word) > 2 and word[0].isalpha()
+
+
+def trigrams(word: str) -> set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.clear()
+
+    def clear(self) -> None:
+        self._ids: dict[str, int] = {} # word -> id
+        self._words: list[str | None] = [] # id -> word, None for a removed word
+        self._sizes: list[int] = [] # id -> number of distinct trigrams
+        self._free: list[int] = [] # ids of removed words, reused first
+        self._postings: dict[str, set[int]] = {} # trigram -> word ids
+        self.version: int | None = None # Catalog version the vocabulary was read at, see observe_write
+        self.refreshed = 0.0 # time.monotonic() of the last full sync
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._ids
+
+    def add(self, word: str) -> None:
+        if word in self._ids or not indexable(word):
+            return
+        grams = trigrams(word)
+        if self._free:
+            word_id = self._free.pop()
+            self._words[word_id] = word
+            self._sizes[word_id] = len(grams)
+        else:
+            word_id = len(self._words)
+            self._words.append(word)
+            self._sizes.append(len(grams))
+        self._ids[word] = word_id
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(word_id)
+
+    def discard(self, word: str) -> None:
+        word_id = self._ids.pop(word, None)
+        if word_id is None:
+            return
+        for gram in trigrams(word):
+            ids = self._postings[gram]
+            ids.discard(word_id)
+            if not ids:
+                del self._postings[gram]
+        self._words[word_id] = None
+        self._free.append(word_id)
+
+    def sync(self, words) -> tuple[int, int]:
+        # Make the index hold exactly these words, touching only the difference.
+        # Returns (added, removed).
+        current = set(words)
+        removed = self._ids.keys() - current
+        for word in removed:
+            self.discard(word)
+        added = [word for word in current - self._ids.keys() if indexable(word)]
+        for word in added:
+            self.add(word)
+        return len(added), len(removed)
+
+    def observe_write(self, words, version: int, changed: int = 1) -> None:
+        # Words of rows written by this process. Adding is always safe (a word without books
+        # only costs a lookup that finds nothing); the version moves along only when nobody
+        # else wrote in between, otherwise the owner has to sync from the source again.
+        for word in words:
+            self.add(word)
+        if self.version is not None and version - changed == self.version:
+            self.version = version
+
+    def similar(self, word: str, threshold: float, limit: int) -> list[tuple[str, float]]:
+        # Indexed words with similarity >= threshold, best first. A strict pass runs first: it
+        # touches fewer posting lists and when it already finds limit words those are the best
+        # ones, so the full pass at threshold is only needed for rarer words.
+        grams = trigrams(word)
+        lists = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        matches = []
+        if threshold < STRICT_THRESHOLD:
+            matches = self._matches(len(grams), lists, STRICT_THRESHOLD)
+        if len(matches) < limit:
+            matches = self._matches(len(grams), lists, threshold)
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches[:limit]
+
+    def _matches(self, size: int, lists: list, threshold: float) -> list[tuple[str, float]]:
+        # similarity >= threshold needs at least ceil(threshold * size) shared trigrams, so a
+        # match must occur in one of the size - that + 1 rarest posting lists
+        needed = max(1, math.ceil(threshold * size - 1e-9))
+        split = len(lists) - needed + 1
+        candidates = Counter()
+        for ids in lists[:split]:
+            candidates.update(ids)
+        for ids in lists[split:]:
+            candidates.update(candidates.keys() & ids)
+
+        sizes = self._sizes
+        scores = [(word_id, shared / (size + sizes[word_id] - shared))
+                  for word_id, shared in candidates.items() if shared >= needed]
+        return [(self._words[word_id], score) for word_id, score in scores if score >= threshold]
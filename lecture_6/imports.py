@@ -0,0 +1,246 @@
+import asyncio
+import csv
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import aclosing
+from typing import AsyncIterator, Callable
+
+from ingest import iter_ndjson
+
+# Background catalog imports. The upload is spooled to a file first, so the request ends as
+# soon as the body is on disk; a task then feeds the file through the bulk insert path one
+# chunk (= one transaction) at a time. At most max_running imports run at once, the rest wait
+# in "queued", so imports can't monopolize the writer connection.
+#
+# Job state lives in a JobStore. With a shared store (main.SqliteJobStore, a table in books.db)
+# any worker can report on a job and the running cap holds across workers; the spooled file
+# stays with the worker that accepted the upload, which is also the one that runs it.
+
+READ_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 100 # Error details kept per job, the counters keep counting
+CLAIM_INTERVAL = 0.25 # Seconds between attempts of a queued job to get a running slot
+STALE_SECONDS = 60 # A job whose worker stopped updating it this long is marked failed
+JOB_FIELDS = ("id", "format", "status", "bytes", "rows", "created", "conflicts", "invalid",
+              "errors", "detail", "started", "finished")
+
+
+class ImportJob:
+    def __init__(self, job_id: str, fmt: str, path: str):
+        self.id = job_id
+        self.format = fmt
+        self.path = path
+        self.status = "queued" # queued -> running -> done | failed
+        self.bytes = 0
+        self.rows = 0
+        self.created = 0
+        self.conflicts = 0
+        self.invalid = 0
+        self.errors: list[dict] = []
+        self.detail: str | None = None
+        self.started: float | None = None # Wall clock, so other workers can report the job
+        self.finished: float | None = None
+
+    def state(self) -> dict:
+        # What a JobStore keeps, JOB_FIELDS
+        return {name: getattr(self, name) for name in JOB_FIELDS}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "ImportJob":
+        job = cls(state["id"], state["format"], None)
+        for name in JOB_FIELDS:
+            setattr(job, name, state[name])
+        return job
+
+    def record(self, results: list[dict]) -> None:
+        # Outcome of one processed chunk, same result dicts as POST /books/bulk
+        for result in results:
+            self.rows += 1
+            status = result["status"]
+            if status == "created":
+                self.created += 1
+            elif status == "conflict":
+                self.conflicts += 1
+            else:
+                self.invalid += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append({"row": result["index"], "errors": result.get("errors")})
+
+    def report(self) -> dict:
+        elapsed = None
+        if self.started is not None:
+            elapsed = (self.finished or time.time()) - self.started
+        return {
+            "id": self.id,
+            "status": self.status,
+            "format": self.format,
+            "bytes": self.bytes,
+            "rows": self.rows,
+            "created": self.created,
+            "conflicts": self.conflicts,
+            "invalid": self.invalid,
+            "seconds": None if elapsed is None else round(elapsed, 3),
+            "rows_per_sec": round(self.rows / elapsed, 1) if elapsed else None,
+            "errors": self.errors,
+            "detail": self.detail,
+        }
+
+
+async def file_chunks(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_SIZE):
+            yield chunk
+
+
+async def iter_csv_file(path: str) -> AsyncIterator[object]:
+    # Header row names the fields (title, author, year; extra columns such as id are ignored)
+    with open(path, encoding="utf-8", newline="") as f:
+        for n, row in enumerate(csv.DictReader(f)):
+            if None in row:
+                yield ValueError("Row has more fields than the header")
+                continue
+            if row.get("year") == "":
+                row["year"] = None
+            yield row
+            if n % 1000 == 999:
+                await asyncio.sleep(0) # Parsing is synchronous, let requests run in between
+
+
+def iter_file_records(path: str, fmt: str) -> AsyncIterator[object]:
+    if fmt == "csv":
+        return iter_csv_file(path)
+    return iter_ndjson(file_chunks(path))
+
+
+class JobStore(ABC):
+    @abstractmethod
+    async def add(self, job: ImportJob) -> None:
+        ...
+
+    @abstractmethod
+    async def claim(self, job: ImportJob, max_running: int) -> bool:
+        # queued -> running when fewer than max_running jobs run and no older job is queued;
+        # must be atomic across everyone sharing the store
+        ...
+
+    @abstractmethod
+    async def save(self, job: ImportJob) -> bool:
+        # Status, counters and errors after a chunk or at the end. False when the store already
+        # has the job as done or failed, e.g. given up on as abandoned; the stored state is kept
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> ImportJob | None:
+        ...
+
+    @abstractmethod
+    async def counts(self) -> dict[str, int]:
+        ...
+
+    @abstractmethod
+    async def prune(self, max_history: int) -> None:
+        # Forget all but the max_history most recently finished jobs
+        ...
+
+
+class MemoryJobStore(JobStore):
+    # Jobs of this process only, for the memory backend whose catalog isn't shared either
+    def __init__(self):
+        self.jobs: dict[str, ImportJob] = {}
+
+    async def add(self, job: ImportJob) -> None:
+        self.jobs[job.id] = job
+
+    async def claim(self, job: ImportJob, max_running: int) -> bool:
+        running = sum(1 for j in self.jobs.values() if j.status == "running")
+        first = next(j for j in self.jobs.values() if j.status == "queued")
+        if running >= max_running or first is not job:
+            return False
+        job.status = "running"
+        job.started = time.time()
+        return True
+
+    async def save(self, job: ImportJob) -> bool:
+        return True # The stored job is the same object
+
+    async def get(self, job_id: str) -> ImportJob | None:
+        return self.jobs.get(job_id)
+
+    async def counts(self) -> dict[str, int]:
+        statuses = [job.status for job in self.jobs.values()]
+        return {status: statuses.count(status) for status in ("queued", "running", "done", "failed")}
+
+    async def prune(self, max_history: int) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:max(len(finished) - max_history, 0)]:
+            del self.jobs[job_id]
+
+
+class ImportManager:
+    def __init__(self, spool_dir: str, max_running: int,
+                 process: Callable[[AsyncIterator[object]], AsyncIterator[list[dict]]],
+                 store: JobStore, max_history: int = 100):
+        self.spool_dir = spool_dir
+        self.max_running = max_running
+        self.process = process # Consumes the records, yields the results of every chunk
+        self.store = store
+        self.max_history = max_history # Finished jobs kept for GET /imports/{id}
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, chunks: AsyncIterator[bytes], fmt: str) -> ImportJob:
+        # Spool the upload, then start processing in the background
+        os.makedirs(self.spool_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        job = ImportJob(job_id, fmt, os.path.join(self.spool_dir, f"{job_id}.{fmt}"))
+        try:
+            with open(job.path, "wb") as f:
+                async for chunk in chunks:
+                    f.write(chunk)
+                    job.bytes += len(chunk)
+            await self.store.add(job)
+        except BaseException:
+            os.remove(job.path)
+            raise
+
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: ImportJob) -> None:
+        try:
+            # Slots are freed by other workers too, so waiting is polling the store
+            while not await self.store.claim(job, self.max_running):
+                await asyncio.sleep(CLAIM_INTERVAL)
+            async with aclosing(self.process(iter_file_records(job.path, job.format))) as chunks:
+                async for results in chunks:
+                    job.record(results)
+                    if not await self.store.save(job):
+                        return # Failed as abandoned meanwhile, its slot may belong to another job now
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.detail = "Interrupted by shutdown"
+            raise
+        except Exception as exc:
+            job.status = "failed"
+            job.detail = str(exc)
+        finally:
+            job.finished = time.time()
+            os.remove(job.path)
+            await self.store.save(job)
+            await self.store.prune(self.max_history)
+
+    async def report(self, job_id: str) -> dict | None:
+        job = await self.store.get(job_id)
+        return None if job is None else job.report()
+
+    async def stats(self) -> dict[str, int]:
+        return await self.store.counts()
+
+    async def shutdown(self) -> None:
+        # Stop unfinished imports; rows from committed chunks stay
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,145 @@
+import codecs
+import json
+import re
+from typing import AsyncIterator
+
+# Incremental parsers for bulk payloads — records are yielded as soon as they are complete,
+# so the whole body never has to be kept in memory.
+# A record that cannot be parsed is yielded as a ValueError instead of a dict.
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|["\[\]{},]') # Strings whole, structural characters
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*\Z") # Rest of the buffer could still belong to the number
+MAX_ELEMENT_CHARS = 1 << 20 # An element still incomplete past this size is given up on
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    # One JSON document per line, empty lines are skipped
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            record = _parse_line(line)
+            if record is not None:
+                yield record
+    record = _parse_line(buffer)
+    if record is not None:
+        yield record
+
+
+def _parse_line(line: bytes) -> object | None:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return exc
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    # Elements of a top-level JSON array, decoded one by one with raw_decode. An element that
+    # can't be decoded is yielded as a ValueError and parsing goes on after it, so one bad
+    # record doesn't cost the ones behind it or make the parser buffer the rest of the body.
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    # start -> first -> delimiter -> value -> delimiter ... -> after -> end. "]" closes the
+    # array in first and delimiter only, so "[1,]" is an error; after it only whitespace may follow
+    state = "start"
+
+    def drain(eof: bool):
+        # Yields what can be decoded from buffer[pos:]; returns to wait for more data
+        nonlocal pos, state
+        while state != "end":
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                return
+            char = buffer[pos]
+            if state == "start":
+                state = "first"
+                if char != "[":
+                    state = "end"
+                    yield ValueError("Expected a JSON array")
+                pos += 1
+                continue
+            if state == "after":
+                state = "end"
+                yield ValueError("Unexpected data after the JSON array")
+                return
+            if state == "delimiter" and char == ",":
+                state = "value"
+                pos += 1
+                continue
+            if char == "]":
+                pos += 1
+                if state == "value":
+                    yield ValueError("Expected a JSON array element after ','")
+                state = "after"
+                continue
+            if state in ("first", "value"):
+                try:
+                    record, end = _decoder.raw_decode(buffer, pos)
+                except ValueError as exc:
+                    error = exc
+                else:
+                    if not eof and isinstance(record, (int, float)) and _NUMBER_TAIL.match(buffer, end):
+                        return # "12" may go on as "123" in the next chunk
+                    state = "delimiter"
+                    pos = end
+                    yield record
+                    continue
+            else:
+                error = ValueError("Expected ',' or ']' after the previous element")
+            # Either a malformed element or one that isn't complete yet: it is only malformed
+            # once the "," or "]" after it is in the buffer
+            boundary = _element_end(buffer, pos)
+            if boundary is None and not eof:
+                if len(buffer) - pos > MAX_ELEMENT_CHARS:
+                    state = "end"
+                    yield ValueError("JSON array element is too large")
+                return
+            yield ValueError(f"Malformed JSON array element: {error}")
+            if boundary is None:
+                state = "end"
+                return
+            state = "delimiter"
+            pos = boundary
+
+    async for chunk in chunks:
+        buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        for record in drain(eof=False):
+            yield record
+        if state == "end":
+            return
+    buffer = buffer[pos:] + text_decoder.decode(b"", final=True)
+    pos = 0
+    for record in drain(eof=True):
+        yield record
+    if state == "start":
+        yield ValueError("Expected a JSON array")
+    elif state in ("first", "value", "delimiter"):
+        yield ValueError("Unterminated JSON array, expected ']'")
+
+
+def _element_end(buffer: str, pos: int) -> int | None:
+    # Position of the "," or "]" that ends the array element starting at pos, skipping nested
+    # arrays, objects and strings; None when the buffer ends first
+    depth = 0
+    for match in _TOKEN.finditer(buffer, pos):
+        token = match.group()
+        if token == '"':
+            return None # Unterminated string
+        if token in ("[", "{"):
+            depth += 1
+        elif token in ("]", "}"):
+            if depth == 0 and token == "]":
+                return match.start()
+            depth = max(depth - 1, 0)
+        elif token == "," and depth == 0:
+            return match.start()
+    return None
@@ -1,27 +1,197 @@
-from typing import Annotated
+import argparse
+import asyncio
+import base64
+import binascii
+import csv
+import hashlib
+import io
+import itertools
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Annotated, AsyncIterator, Literal
 
-from fastapi import FastAPI, HTTPException, Depends, Query
-from pydantic import BaseModel, Field, ConfigDict, field_validator
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ConfigDict, ValidationError, field_validator
 
-from sqlalchemy import select, delete, update, func, Integer
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import select, insert, delete, update, tuple_, event, table, column, Index, Integer, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncConnection, AsyncSession
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 import uvicorn
 
-app = FastAPI() # Initialize FastAPI application
+from admission import AdmissionMiddleware, Limiter
+from batching import WriteBatcher
+from cache import ResponseCache
+from fuzzy import TrigramIndex, indexable
+from imports import JOB_FIELDS, STALE_SECONDS, ImportJob, ImportManager, JobStore, MemoryJobStore
+from ingest import iter_json_array, iter_ndjson
+import metrics
+from storage import BookRepository, MemoryBookRepository, fold_text, normalize_key, text_words
 
-engine = create_async_engine('sqlite+aiosqlite:///books.db') # Async SQLite engine
+try:
+    import orjson
+except ImportError: # stdlib fallback, same output just slower
+    orjson = None
 
-new_session = async_sessionmaker(engine, expire_on_commit=False) # Session factory
+startup_log = logging.getLogger("books.startup")
 
 
-async def get_session():
-    # Provide DB session for each request
-    async with new_session() as session:
-        yield session
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Get the process ready before it takes traffic: schema, open connections, compiled queries
+    for phase, step in STARTUP_PHASES:
+        started = time.perf_counter()
+        await step()
+        startup_timings[phase] = time.perf_counter() - started
+        startup_log.info("startup phase %s took %.1f ms", phase, startup_timings[phase] * 1000)
+    yield
+    await import_manager.shutdown()
+    await dispose_engines()
 
-SessionDep = Annotated[AsyncSession, Depends(get_session)]
+
+app = FastAPI(lifespan=lifespan) # Initialize FastAPI application
+
+
+def dump_json(content) -> bytes:
+    # Fast JSON encoding for pre-rendered responses
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+DATABASE_PATH = os.getenv("BOOKS_DB_PATH", "books.db")
+DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+
+# "production": WAL + tuned pragmas, reader pool and one serialized writer connection
+# "default": a single engine with driver defaults
+ENGINE_PROFILE = os.getenv("BOOKS_ENGINE_PROFILE", "production")
+READER_POOL_SIZE = int(os.getenv("BOOKS_READER_POOL_SIZE", "4"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("BOOKS_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("BOOKS_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("BOOKS_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("BOOKS_CACHE_SIZE", "-65536")), # negative = KiB
+    "busy_timeout": int(os.getenv("BOOKS_BUSY_TIMEOUT", "5000")), # ms
+}
+
+
+def apply_pragmas(dbapi_connection, read_only: bool = False) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    if read_only:
+        cursor.execute("PRAGMA query_only = ON")
+    cursor.close()
+
+
+METRICS_ENABLED = os.getenv("BOOKS_METRICS_ENABLED", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("BOOKS_SLOW_QUERY_MS", "0")) # 0 disables the slow query log
+
+
+def make_engine(name: str, **kwargs):
+    if METRICS_ENABLED:
+        kwargs["poolclass"] = metrics.measured_pool(name)
+    new_engine = create_async_engine(DATABASE_URL, **kwargs)
+    if METRICS_ENABLED:
+        metrics.instrument_engine(new_engine.sync_engine, name, SLOW_QUERY_MS)
+    return new_engine
+
+
+if ENGINE_PROFILE == "production":
+    # All writes share one connection, so writers queue in the pool instead of fighting for the lock
+    engine = make_engine("writer", pool_size=1, max_overflow=0)
+    read_engine = make_engine("reader", pool_size=READER_POOL_SIZE, max_overflow=0)
+    event.listen(engine.sync_engine, "connect", lambda conn, record: apply_pragmas(conn))
+    event.listen(read_engine.sync_engine, "connect", lambda conn, record: apply_pragmas(conn, read_only=True))
+else:
+    engine = make_engine("default") # Async SQLite engine
+    read_engine = engine
+
+
+def admission_limiter(name: str, concurrency: int, queue: int, max_wait_ms: int) -> Limiter:
+    # BOOKS_<CLASS>_CONCURRENCY, BOOKS_<CLASS>_QUEUE and BOOKS_<CLASS>_MAX_WAIT_MS
+    prefix = f"BOOKS_{name.upper()}_"
+    return Limiter(
+        limit=int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+        max_queue=int(os.getenv(prefix + "QUEUE", str(queue))),
+        max_wait=float(os.getenv(prefix + "MAX_WAIT_MS", str(max_wait_ms))) / 1000,
+    )
+
+
+# Per route class limits. More reads than pooled reader connections only interleave on the
+# CPU, writes share one connection (a few in flight keep group commit busy), bulk requests
+# hold it for whole chunks. BOOKS_ADMISSION_ENABLED=0 turns it off.
+admission_limiters = {
+    "reads": admission_limiter("reads", 2 * READER_POOL_SIZE, 256, 500),
+    "writes": admission_limiter("writes", 16, 128, 1000),
+    "bulk": admission_limiter("bulk", 2, 4, 5000),
+}
+app.add_middleware(AdmissionMiddleware, limiters=admission_limiters,
+                   enabled=os.getenv("BOOKS_ADMISSION_ENABLED", "1") == "1")
+
+if METRICS_ENABLED:
+    # Added last so it is outermost and also times requests turned away by admission control
+    app.add_middleware(metrics.MetricsMiddleware)
+
+new_session = async_sessionmaker(engine, expire_on_commit=False) # Session factory (writes)
+new_read_session = async_sessionmaker(read_engine, expire_on_commit=False) # Session factory (reads)
+
+# Optional group commit for POST/PUT/DELETE, BOOKS_WRITE_BATCHING=1 turns it on
+write_batcher = WriteBatcher(
+    engine,
+    max_batch=int(os.getenv("BOOKS_BATCH_MAX_SIZE", "64")),
+    max_wait=float(os.getenv("BOOKS_BATCH_MAX_WAIT_MS", "2")) / 1000,
+    enabled=os.getenv("BOOKS_WRITE_BATCHING", "0") == "1",
+)
+
+# Read cache for list/search/by-id responses, BOOKS_CACHE_ENABLED=0 turns it off
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("BOOKS_CACHE_MAXSIZE", "1024")),
+    ttl=float(os.getenv("BOOKS_CACHE_TTL", "30")),
+    enabled=os.getenv("BOOKS_CACHE_ENABLED", "1") == "1",
+)
+
+
+# "sqlite": books.db through SQLAlchemy
+# "memory": in-process store, filled from BOOKS_SNAPSHOT (NDJSON export or books.db) at startup
+STORAGE_BACKEND = os.getenv("BOOKS_STORAGE", "sqlite")
+SNAPSHOT_PATH = os.getenv("BOOKS_SNAPSHOT")
+memory_repository = MemoryBookRepository() if STORAGE_BACKEND == "memory" else None
+
+# Fuzzy search (GET /books/search?q=...&fuzzy=true). The SQLite backend keeps the vocabulary
+# of books_fts in a trigram index in this process; its own writes are added right away,
+# writes from other processes are picked up at most every BOOKS_FUZZY_REFRESH_SECONDS.
+FUZZY_THRESHOLD = float(os.getenv("BOOKS_FUZZY_THRESHOLD", "0.4"))
+FUZZY_REFRESH_SECONDS = float(os.getenv("BOOKS_FUZZY_REFRESH_SECONDS", "5"))
+FUZZY_EXPANSIONS = 5 # Similar words tried per query word
+FUZZY_CANDIDATES = 200 # Matching books ranked per query
+vocabulary = TrigramIndex()
+vocabulary_lock = asyncio.Lock()
+
+
+@asynccontextmanager
+async def open_repository():
+    # The SQLite repository reads on a reader pool session
+    if memory_repository is not None:
+        yield memory_repository
+    else:
+        async with new_read_session() as session:
+            yield SqliteBookRepository(session)
+
+
+async def get_repository():
+    # Storage backend for each request
+    async with open_repository() as repo:
+        yield repo
+
+RepositoryDep = Annotated[BookRepository, Depends(get_repository)]
 
 class Base(DeclarativeBase):
     pass
@@ -33,6 +203,268 @@ class BookModel(Base):
     title: Mapped[str]
     author: Mapped[str]
     year: Mapped[int | None]
+    # Case-folded copies of title/author used for duplicate detection
+    title_key: Mapped[str]
+    author_key: Mapped[str]
+
+    __table_args__ = (
+        Index("ux_books_title_author_year", "title_key", "author_key", "year", unique=True),
+        Index("ix_books_author_key", "author_key"),
+    )
+
+
+# External-content FTS5 index over books(title, author), kept in sync by triggers
+books_fts = table("books_fts", column("rowid"), column("title"), column("author"))
+
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author, content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO books_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END""",
+    # Distinct indexed words, the vocabulary of fuzzy search
+    "CREATE VIRTUAL TABLE IF NOT EXISTS books_fts_vocab USING fts5vocab(books_fts, 'row')",
+]
+
+
+def create_fts(conn) -> bool:
+    # Returns True when the index did not exist yet and has to be filled
+    exists = conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'books_fts'").first()
+    for statement in FTS_DDL:
+        conn.exec_driver_sql(statement)
+    return exists is None
+
+
+# Catalog version, bumped by triggers on every change to books; ETags are derived from it
+VERSION_DDL = [
+    "CREATE TABLE IF NOT EXISTS catalog_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)",
+    """CREATE TRIGGER IF NOT EXISTS books_version_ai AFTER INSERT ON books BEGIN
+        UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_version_ad AFTER DELETE ON books BEGIN
+        UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS books_version_au AFTER UPDATE ON books BEGIN
+        UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+    END""",
+]
+
+
+def create_version_table(conn) -> None:
+    for statement in VERSION_DDL:
+        conn.exec_driver_sql(statement)
+
+
+# Book counts per author, year and decade, kept current by triggers so /books/stats reads
+# one row per group instead of aggregating books. Books without a year only count in total.
+# Authors are grouped by author_key like duplicates are, and shown by the smallest of their
+# spellings, so "Tolstoy" and "tolstoy" are one author named "Tolstoy".
+STATS_TABLES = {
+    # table: (group column, expression over books, {other column: aggregate over the group})
+    "stats_by_author": ("author_key", "author_key", {"author": "MIN(author)"}),
+    "stats_by_year": ("year", "year", {}),
+    "stats_by_decade": ("decade", "year / 10 * 10", {}),
+}
+
+_STATS_ADD = """
+        INSERT INTO stats_by_author (author_key, author, books) VALUES ({row}.author_key, {row}.author, 1)
+            ON CONFLICT (author_key) DO UPDATE SET books = books + 1, author = MIN(author, excluded.author);
+        INSERT INTO stats_by_year (year, books) SELECT {row}.year, 1 WHERE {row}.year IS NOT NULL
+            ON CONFLICT (year) DO UPDATE SET books = books + 1;
+        INSERT INTO stats_by_decade (decade, books) SELECT {row}.year / 10 * 10, 1 WHERE {row}.year IS NOT NULL
+            ON CONFLICT (decade) DO UPDATE SET books = books + 1;"""
+
+_STATS_REMOVE = """
+        UPDATE stats_by_author SET books = books - 1 WHERE author_key = {row}.author_key;
+        DELETE FROM stats_by_author WHERE author_key = {row}.author_key AND books = 0;
+        UPDATE stats_by_author SET author = (SELECT MIN(author) FROM books WHERE author_key = {row}.author_key)
+            WHERE author_key = {row}.author_key AND author = {row}.author;
+        UPDATE stats_by_year SET books = books - 1 WHERE year = {row}.year;
+        DELETE FROM stats_by_year WHERE year = {row}.year AND books = 0;
+        UPDATE stats_by_decade SET books = books - 1 WHERE decade = {row}.year / 10 * 10;
+        DELETE FROM stats_by_decade WHERE decade = {row}.year / 10 * 10 AND books = 0;"""
+
+STATS_DDL = [
+    "CREATE TABLE IF NOT EXISTS stats_by_author "
+    "(author_key VARCHAR PRIMARY KEY, author VARCHAR NOT NULL, books INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS stats_by_year (year INTEGER PRIMARY KEY, books INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS stats_by_decade (decade INTEGER PRIMARY KEY, books INTEGER NOT NULL)",
+    f"""CREATE TRIGGER IF NOT EXISTS books_stats_ai AFTER INSERT ON books BEGIN{_STATS_ADD.format(row="new")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_stats_ad AFTER DELETE ON books BEGIN{_STATS_REMOVE.format(row="old")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS books_stats_au AFTER UPDATE OF author, author_key, year ON books BEGIN{_STATS_REMOVE.format(row="old")}{_STATS_ADD.format(row="new")}
+    END""",
+]
+
+
+def create_stats_tables(conn) -> bool:
+    # Returns True when the tables did not exist yet and have to be filled
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(stats_by_author)")}
+    if columns and "author_key" not in columns:
+        # Counted per spelling of the author before; regrouped and refilled below
+        conn.exec_driver_sql("DROP TABLE stats_by_author")
+        for trigger in ("books_stats_ai", "books_stats_ad", "books_stats_au"):
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    for statement in STATS_DDL:
+        conn.exec_driver_sql(statement)
+    return "author_key" not in columns
+
+
+def stats_columns(name: str) -> str:
+    # Stored columns of a summary table, group first and count last
+    group, _, others = STATS_TABLES[name]
+    return ", ".join([group, *others, "books"])
+
+
+def stats_from_scratch_query(name: str) -> str:
+    group, expression, others = STATS_TABLES[name]
+    aggregates = "".join(f"{aggregate} AS {column}, " for column, aggregate in others.items())
+    return (f"SELECT {expression} AS {group}, {aggregates}COUNT(*) FROM books WHERE {expression} IS NOT NULL "
+            f"GROUP BY 1 ORDER BY 1")
+
+
+def rebuild_stats(conn) -> None:
+    # Recompute every summary table from books
+    for name in STATS_TABLES:
+        conn.exec_driver_sql(f"DELETE FROM {name}")
+        conn.exec_driver_sql(f"INSERT INTO {name} ({stats_columns(name)}) {stats_from_scratch_query(name)}")
+
+
+def check_stats(conn) -> dict[str, list]:
+    # Compare the summary tables with a fresh GROUP BY, returns (group, stored, actual) per mismatch,
+    # stored/actual being the columns after the group: (books,) or (author, books)
+    mismatches = {}
+    for name in STATS_TABLES:
+        stored_query = f"SELECT {stats_columns(name)} FROM {name}"
+        stored = {key: tuple(values) for key, *values in conn.exec_driver_sql(stored_query)}
+        actual = {key: tuple(values) for key, *values in conn.exec_driver_sql(stats_from_scratch_query(name))}
+        diff = [(key, stored.get(key), actual.get(key))
+                for key in sorted(stored.keys() | actual.keys(), key=str) if stored.get(key) != actual.get(key)]
+        if diff:
+            mismatches[name] = diff
+    return mismatches
+
+
+# Import jobs, shared by every worker: GET /imports/{id} works on any of them and
+# BOOKS_IMPORT_CONCURRENCY caps running imports across all of them. Not part of Base, so
+# POST /setup_database keeps the job history.
+IMPORT_JOBS_DDL = """CREATE TABLE IF NOT EXISTS import_jobs (
+    id VARCHAR PRIMARY KEY,
+    format VARCHAR NOT NULL,
+    status VARCHAR NOT NULL,
+    bytes INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    created INTEGER NOT NULL,
+    conflicts INTEGER NOT NULL,
+    invalid INTEGER NOT NULL,
+    errors VARCHAR NOT NULL,
+    detail VARCHAR,
+    started REAL,
+    finished REAL,
+    submitted REAL NOT NULL,
+    updated REAL NOT NULL
+)"""
+
+
+def rebuild_fts(conn) -> None:
+    # Re-read every row of books into the full-text index
+    conn.exec_driver_sql("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+
+@event.listens_for(BookModel.__table__, "after_create")
+def _create_fts_after_books(target, connection, **kw):
+    create_fts(connection)
+    create_version_table(connection)
+    create_stats_tables(connection)
+
+
+@event.listens_for(BookModel.__table__, "before_drop")
+def _drop_fts_before_books(target, connection, **kw):
+    connection.exec_driver_sql("DROP TABLE IF EXISTS books_fts_vocab")
+    connection.exec_driver_sql("DROP TABLE IF EXISTS books_fts")
+    # catalog_version stays: a recreated catalog must not hand out ETags seen before the reset
+    for name in STATS_TABLES:
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {name}")
+
+
+def migrate_schema(conn) -> None:
+    # Bring an existing books table up to date without dropping data.
+    # BEGIN IMMEDIATE takes the write lock first, so processes starting together migrate one
+    # after another and the later ones find nothing left to do.
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    conn.exec_driver_sql(IMPORT_JOBS_DDL)
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(books)")}
+    if not columns:
+        Base.metadata.create_all(conn)
+        return
+
+    for name in ("title_key", "author_key"):
+        if name not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE books ADD COLUMN {name} VARCHAR NOT NULL DEFAULT ''")
+
+    # Backfill keys for rows written before the columns existed
+    rows = conn.exec_driver_sql(
+        "SELECT id, title, author FROM books WHERE title_key = '' OR author_key = ''"
+    ).all()
+    if rows:
+        conn.execute(
+            text("UPDATE books SET title_key = :title_key, author_key = :author_key WHERE id = :id"),
+            [{"id": i, "title_key": normalize_key(t), "author_key": normalize_key(a)} for i, t, a in rows],
+        )
+
+    if create_fts(conn):
+        rebuild_fts(conn)
+    create_version_table(conn)
+    if create_stats_tables(conn):
+        rebuild_stats(conn)
+
+    try:
+        for index in BookModel.__table__.indexes:
+            index.create(conn, checkfirst=True)
+    except IntegrityError:
+        duplicates = conn.exec_driver_sql(
+            "SELECT title_key, author_key, year, COUNT(*) FROM books WHERE year IS NOT NULL "
+            "GROUP BY title_key, author_key, year HAVING COUNT(*) > 1"
+        ).all()
+        raise RuntimeError(f"Cannot create unique book index, duplicated rows: {duplicates}")
+
+
+async def migrate_database() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate_schema)
+
+
+async def rebuild_fts_index() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(rebuild_fts)
+
+
+async def rebuild_stats_tables() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(rebuild_stats)
+
+
+async def check_stats_tables() -> dict[str, list]:
+    async with read_engine.connect() as conn:
+        return await conn.run_sync(check_stats)
+
+
+async def dispose_engines() -> None:
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
 
 class BookAddSchema(BaseModel):
     # ORM model representing a book data to enter
@@ -44,152 +476,962 @@ class BookAddSchema(BaseModel):
 class BookSchema(BookAddSchema):
     id: int
 
+
+class BookPatchSchema(BaseModel):
+    # Partial update — only the fields present in the body are changed, year may be set to null
+    title: str | None = Field(default=None, min_length=1, max_length= 50)
+    author: str | None = Field(default=None, min_length=1, max_length= 30)
+    year: int | None = Field(default=None, ge=0)
+
+    @field_validator("title", "author")
+    @classmethod
+    def not_null(cls, value: str | None) -> str:
+        # None only stands for "not sent" (the default isn't validated), title/author can't be null
+        if value is None:
+            raise ValueError("cannot be null")
+        return value
+
+
+class BulkResultSchema(BaseModel):
+    # Outcome for one record of a bulk request: created / conflict / invalid
+    index: int
+    status: str
+    id: int | None = None
+    errors: list[dict] | None = None
+
+
+class BulkReportSchema(BaseModel):
+    created: int
+    conflicts: int
+    invalid: int
+    results: list[BulkResultSchema]
+
+
+BULK_CHUNK_SIZE = 500 # Records validated and inserted per transaction
+IMPORT_CHUNK_SIZE = int(os.getenv("BOOKS_IMPORT_CHUNK_SIZE", str(BULK_CHUNK_SIZE)))
+EXPORT_BATCH_SIZE = 1000 # Rows fetched from the cursor per streamed chunk
+
 @app.get("/healthcheck")
 async def healthcheck() -> dict:
     return {"status": "ok"}
 
+@app.get("/cache/stats")
+async def cache_stats() -> dict:
+    return response_cache.stats()
+
+@app.get("/admission/stats")
+async def admission_stats() -> dict:
+    return {name: limiter.stats() for name, limiter in admission_limiters.items()}
+
+# Point-in-time values from the cache and the write batcher, filled in on scrape
+CACHE_STATS = metrics.Gauge("books_cache", "Response cache counters", ("stat",))
+BATCHER_STATS = metrics.Gauge("books_write_batcher", "Group commit counters", ("stat",))
+STARTUP_STATS = metrics.Gauge("books_startup_phase_seconds", "Duration of each startup phase", ("phase",))
+IMPORT_STATS = metrics.Gauge("books_imports", "Import jobs by status", ("status",))
+ADMISSION_STATS = metrics.Gauge("books_admission", "Admission control state per route class", ("class", "stat"))
+ADMISSION_REJECTED = metrics.Counter("books_admission_rejected_total", "Requests turned away with 503",
+                                     ("class", "reason"))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    # Prometheus text exposition format
+    for name, value in response_cache.stats().items():
+        CACHE_STATS.set(name, value=float(value))
+    for name, value in write_batcher.stats().items():
+        BATCHER_STATS.set(name, value=float(value))
+    for phase, seconds in startup_timings.items():
+        STARTUP_STATS.set(phase, value=seconds)
+    for status, count in (await import_manager.stats()).items():
+        IMPORT_STATS.set(status, value=count)
+    for name, limiter in admission_limiters.items():
+        stats = limiter.stats()
+        for stat in ("limit", "max_queue", "in_flight", "queued", "admitted", "service_time"):
+            ADMISSION_STATS.set(name, stat, value=float(stats[stat]))
+        for reason in ("queue_full", "deadline"):
+            # Running totals kept by the limiter, copied as they are
+            ADMISSION_REJECTED.values[(name, reason)] = limiter.rejected[reason]
+    return metrics.render([CACHE_STATS, BATCHER_STATS, STARTUP_STATS, IMPORT_STATS,
+                           ADMISSION_STATS, ADMISSION_REJECTED])
+
 @app.post("/setup_database")
-async def setup_database():
+async def setup_database(repo: RepositoryDep):
     # Recreate tables — for testing purposes
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
-        await conn.run_sync(Base.metadata.create_all)
-        return {"success": True}
+    await repo.reset()
+    response_cache.clear()
+    return {"success": True}
+
+
+# Write operations — each runs inside a transaction owned by write_batcher and is a single
+# statement: RETURNING hands back the stored row, so no follow-up SELECT is needed
+
+BOOK_COLUMNS = (BookModel.id, BookModel.title, BookModel.author, BookModel.year)
+
+
+async def insert_book_op(conn: AsyncConnection, title: str, author: str, year: int | None) -> tuple:
+    # Duplicates are rejected by the unique index
+    query = insert(BookModel).values(
+        title=title,
+        author=author,
+        year=year,
+        title_key=normalize_key(title),
+        author_key=normalize_key(author),
+    ).returning(*BOOK_COLUMNS)
+    try:
+        return tuple((await conn.execute(query)).one())
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="This book already exists.")
+
+
+async def update_book_op(conn: AsyncConnection, book_id: int, values: dict) -> tuple:
+    query = update(BookModel).where(BookModel.id == book_id).values(**values).returning(*BOOK_COLUMNS)
+    try:
+        row = (await conn.execute(query)).one_or_none()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="This book already exists.")
+    if row is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return tuple(row)
+
+
+async def delete_book_op(conn: AsyncConnection, book_id: int) -> None:
+    query = delete(BookModel).where(BookModel.id == book_id).returning(BookModel.id)
+    if (await conn.execute(query)).first() is None:
+        raise HTTPException(status_code=404, detail="Book not found")
+
+
+async def versioned(conn: AsyncConnection, operation) -> tuple[object, int]:
+    # Run a write operation and report the catalog version it produced, so the cache can tell
+    # its own writes from writes made by other workers
+    result = await operation
+    version = (await conn.exec_driver_sql("SELECT version FROM catalog_version")).scalar_one()
+    return result, version
+
+
+def update_values(changes: dict) -> dict:
+    # Column values for an UPDATE, keys are kept in sync with title/author
+    values = dict(changes)
+    if "title" in values:
+        values["title_key"] = normalize_key(values["title"])
+    if "author" in values:
+        values["author_key"] = normalize_key(values["author"])
+    return values
 
 
 @app.post("/books", response_model=BookSchema)
-async def add_book(book: BookAddSchema, session: SessionDep) -> BookSchema:
-    # Check if the book is existing
-    if book.year is not None:
-        query = select(BookModel).where(
-            func.lower(BookModel.title) == book.title.lower(),
-            func.lower(BookModel.author) == book.author.lower(),
-            BookModel.year == book.year,
+async def add_book(book: BookAddSchema, repo: RepositoryDep) -> BookSchema:
+    # Add a new book into the database
+    row, version = await repo.insert(book.title, book.author, book.year)
+    response_cache.invalidate(version=version)
+    return BookSchema(**book_dict(row))
+
+
+def encode_cursor(value: int, kind: str = "id") -> str:
+    # Opaque cursor: last book id for lists, position for ranked search results
+    return base64.urlsafe_b64encode(f"{kind}:{value}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str = "id") -> int:
+    # Empty cursor means "start from the beginning"
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, _, value = raw.partition(":")
+        if prefix != kind:
+            raise ValueError(raw)
+        position = int(value)
+        if position < 0:
+            # Ids and positions are never negative; as an OFFSET or a slice it would page wrongly
+            raise ValueError(raw)
+        return position
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def insert_books_chunk(session: AsyncSession, chunk: list[tuple[int, BookAddSchema]]) -> list[dict]:
+    # Insert one chunk of validated books in a single transaction
+    results = []
+    pending = []
+    keys = set()
+    for index, book in chunk:
+        row = {
+            "title": book.title,
+            "author": book.author,
+            "year": book.year,
+            "title_key": normalize_key(book.title),
+            "author_key": normalize_key(book.author),
+        }
+        if book.year is not None:
+            key = (row["title_key"], row["author_key"], book.year)
+            if key in keys:
+                # Same book twice in one request
+                results.append({"index": index, "status": "conflict"})
+                continue
+            keys.add(key)
+        pending.append((index, row))
+
+    # One set-wise lookup for duplicates already in the database
+    if keys:
+        query = select(BookModel.title_key, BookModel.author_key, BookModel.year).where(
+            tuple_(BookModel.title_key, BookModel.author_key, BookModel.year).in_(keys)
         )
-        result = await session.execute(query)
-        existing = result.scalar_one_or_none()
-        if existing is not None:
-            raise HTTPException(status_code=409, detail="This book already exists.")
+        existing = set((await session.execute(query)).all())
+        if existing:
+            for index, row in pending:
+                if (row["title_key"], row["author_key"], row["year"]) in existing:
+                    results.append({"index": index, "status": "conflict"})
+            pending = [
+                (index, row) for index, row in pending
+                if (row["title_key"], row["author_key"], row["year"]) not in existing
+            ]
 
-    # Add a new book into the database
-    new_book = BookModel(
-        title=book.title,
-        author=book.author,
-        year=book.year,
+    if not pending:
+        return results
+
+    query = insert(BookModel).returning(BookModel.id, sort_by_parameter_order=True)
+    try:
+        ids = (await session.execute(query, [row for _, row in pending])).scalars().all()
+        await session.commit()
+    except IntegrityError:
+        # A concurrent writer inserted one of the books — retry row by row
+        await session.rollback()
+        for index, row in pending:
+            try:
+                book_id = (await session.execute(insert(BookModel).returning(BookModel.id), row)).scalar_one()
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                results.append({"index": index, "status": "conflict"})
+            else:
+                results.append({"index": index, "status": "created", "id": book_id})
+        return results
+
+    results.extend({"index": index, "status": "created", "id": book_id} for (index, _), book_id in zip(pending, ids))
+    return results
+
+
+class SqliteBookRepository(BookRepository):
+    # books.db through SQLAlchemy: reads run on the request's reader session,
+    # single-book writes go through write_batcher on the writer connection
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.vocabulary_checked = False
+
+    async def catalog_version(self) -> int:
+        connection = await self.session.connection()
+        return (await connection.exec_driver_sql("SELECT version FROM catalog_version")).scalar_one()
+
+    async def get(self, book_id: int):
+        return (await self.session.execute(select(*BOOK_COLUMNS).where(BookModel.id == book_id))).first()
+
+    async def list_offset(self, limit: int, offset: int) -> list:
+        return (await self.session.execute(select(*BOOK_COLUMNS).limit(limit).offset(offset))).all()
+
+    async def list_after(self, last_id: int, limit: int) -> list:
+        # Seek by primary key, cost doesn't depend on page depth
+        query = select(*BOOK_COLUMNS).where(BookModel.id > last_id).order_by(BookModel.id).limit(limit)
+        return (await self.session.execute(query)).all()
+
+    async def find(self, title_key: str | None, author_key: str | None, year: int | None) -> list:
+        query = select(*BOOK_COLUMNS)
+        conditions = []
+        if title_key:
+            conditions.append(BookModel.title_key == title_key)
+        if author_key:
+            conditions.append(BookModel.author_key == author_key)
+        if year is not None:
+            conditions.append(BookModel.year == year)
+
+        if conditions:
+            query = query.where(*conditions)
+        return (await self.session.execute(query)).all()
+
+    async def search_text(self, words: list[str], year: int | None, limit: int, offset: int) -> list:
+        # FTS5 prefix query ranked by bm25
+        query = (select(*BOOK_COLUMNS)
+                 .join(books_fts, books_fts.c.rowid == BookModel.id)
+                 .where(text("books_fts MATCH :match"))
+                 .order_by(text("bm25(books_fts)"), BookModel.id)
+                 .limit(limit)
+                 .offset(offset))
+        if year is not None:
+            query = query.where(BookModel.year == year)
+        match = " ".join(f'"{word}"*' for word in words)
+        return (await self.session.execute(query, {"match": match})).all()
+
+    async def similar_words(self, word: str, threshold: float, limit: int) -> list[tuple[str, float]]:
+        if not self.vocabulary_checked:
+            # Once per request, a query with several words looks up the same vocabulary
+            self.vocabulary_checked = True
+            version = await self.catalog_version()
+            if vocabulary.version != version:
+                async with vocabulary_lock:
+                    if vocabulary.version is None or (vocabulary.version != version and
+                                                      time.monotonic() - vocabulary.refreshed >= FUZZY_REFRESH_SECONDS):
+                        await self.load_vocabulary(version)
+        return vocabulary.similar(word, threshold, limit)
+
+    async def load_vocabulary(self, version: int) -> None:
+        # Sync the trigram index with books_fts_vocab, only new and vanished words cost work.
+        # Only words starting with a letter take part: terms are sorted, so numbers (there can be
+        # one per book) are skipped by the range instead of being read.
+        terms = await self.session.execute(text("SELECT term FROM books_fts_vocab WHERE term >= 'a'"))
+        vocabulary.sync(terms.scalars())
+        vocabulary.version = version
+        vocabulary.refreshed = time.monotonic()
+
+    async def match_words(self, word_groups: list[list[str]], year: int | None, limit: int) -> list:
+        # One FTS5 query, (a OR b) AND (c OR d), walking the index in rowid order
+        query = (select(*BOOK_COLUMNS)
+                 .join(books_fts, books_fts.c.rowid == BookModel.id)
+                 .where(text("books_fts MATCH :match"))
+                 .order_by(books_fts.c.rowid)
+                 .limit(limit))
+        if year is not None:
+            query = query.where(BookModel.year == year)
+        match = " AND ".join("(" + " OR ".join(f'"{word}"' for word in words) + ")" for words in word_groups)
+        return (await self.session.execute(query, {"match": match})).all()
+
+    async def stats(self) -> tuple[list, list, list]:
+        # Trigger-maintained summary tables, one row per group
+        by_author = (await self.session.execute(text("SELECT author, books FROM stats_by_author ORDER BY author_key"))).all()
+        by_year = (await self.session.execute(text("SELECT year, books FROM stats_by_year ORDER BY year"))).all()
+        by_decade = (await self.session.execute(text("SELECT decade, books FROM stats_by_decade ORDER BY decade"))).all()
+        return by_author, by_year, by_decade
+
+    async def export_batches(self, batch_size: int):
+        # Server-side cursor on a session of its own, the response outlives the request's session
+        query = select(*BOOK_COLUMNS).order_by(BookModel.id).execution_options(yield_per=batch_size)
+        async with new_read_session() as session:
+            result = await session.stream(query)
+            async for rows in result.partitions():
+                yield rows
+
+    async def insert(self, title: str, author: str, year: int | None) -> tuple:
+        row, version = await write_batcher.submit(lambda conn: versioned(conn, insert_book_op(conn, title, author, year)))
+        vocabulary.observe_write(text_words(f"{title} {author}"), version)
+        return row, version
+
+    async def update(self, book_id: int, values: dict) -> tuple:
+        values = update_values(values)
+        row, version = await write_batcher.submit(lambda conn: versioned(conn, update_book_op(conn, book_id, values)))
+        vocabulary.observe_write(text_words(f"{row[1]} {row[2]}"), version)
+        return row, version
+
+    async def delete(self, book_id: int) -> int:
+        _, version = await write_batcher.submit(lambda conn: versioned(conn, delete_book_op(conn, book_id)))
+        vocabulary.observe_write((), version)
+        return version
+
+    async def insert_many(self, chunk: list[tuple[int, BookAddSchema]]) -> list[dict]:
+        async with new_session() as session:
+            results = await insert_books_chunk(session, chunk)
+        # New words become fuzzy-searchable now, the version catches up on the next refresh
+        created = {result["index"] for result in results if result["status"] == "created"}
+        for index, book in chunk:
+            if index in created:
+                for word in text_words(f"{book.title} {book.author}"):
+                    vocabulary.add(word)
+        return results
+
+    async def reset(self) -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.exec_driver_sql("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+        vocabulary.clear()
+
+
+async def insert_records(repo: BookRepository, records: AsyncIterator[object], chunk_size: int = BULK_CHUNK_SIZE):
+    # Validates parsed records and inserts them one chunk (= one transaction) at a time,
+    # yielding the per-record results of every chunk
+    results = []
+    chunk = []
+    index = 0
+    async for record in records:
+        if isinstance(record, Exception):
+            results.append({"index": index, "status": "invalid", "errors": [{"msg": str(record)}]})
+        else:
+            try:
+                chunk.append((index, BookAddSchema.model_validate(record)))
+            except ValidationError as exc:
+                errors = [{"loc": list(e["loc"]), "msg": e["msg"]} for e in exc.errors()]
+                results.append({"index": index, "status": "invalid", "errors": errors})
+        index += 1
+
+        if len(chunk) >= chunk_size:
+            results.extend(await repo.insert_many(chunk))
+            yield results
+            results = []
+            chunk = []
+    if chunk:
+        results.extend(await repo.insert_many(chunk))
+    if results:
+        yield results
+
+
+@app.post("/books/bulk", response_model=BulkReportSchema)
+async def add_books_bulk(request: Request, repo: RepositoryDep) -> BulkReportSchema:
+    # Accepts a JSON array or an NDJSON stream (Content-Type: application/x-ndjson)
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        records = iter_ndjson(request.stream())
+    else:
+        records = iter_json_array(request.stream())
+
+    results = []
+    async for chunk_results in insert_records(repo, records):
+        results.extend(chunk_results)
+
+    results.sort(key=lambda r: r["index"])
+    statuses = [r["status"] for r in results]
+    if "created" in statuses:
+        response_cache.invalidate()
+    return BulkReportSchema(
+        created=statuses.count("created"),
+        conflicts=statuses.count("conflict"),
+        invalid=statuses.count("invalid"),
+        results=results,
     )
 
-    session.add(new_book)
-    await session.commit()
-    await session.refresh(new_book)
-    return BookSchema(id=new_book.id, title=new_book.title, author=new_book.author, year=new_book.year)
+
+async def export_rows(repo: BookRepository, fmt: str):
+    # Stream the catalog one batch at a time
+    batches = repo.export_batches(EXPORT_BATCH_SIZE)
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["id", "title", "author", "year"])
+        # The header goes out first, so an empty catalog still exports a valid CSV
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        async for rows in batches:
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        async for rows in batches:
+            yield b"".join(
+                dump_json({"id": i, "title": t, "author": a, "year": y}) + b"\n" for i, t, a, y in rows
+            )
+
+
+@app.get("/books/export")
+async def export_books(repo: RepositoryDep, format: Literal["ndjson", "csv"] = Query("ndjson")):
+    # Full catalog dump, memory use does not depend on the table size
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f"attachment; filename=books.{format}"}
+    return StreamingResponse(export_rows(repo, format), media_type=media_type, headers=headers)
+
+
+@app.get("/books/stats")
+async def get_stats(request: Request, repo: RepositoryDep):
+    # Dashboard counts, read from summary tables kept current on every write
+    key = ("stats",)
+    headers, not_modified = await check_etag(request, repo, key)
+    if not_modified is not None:
+        return not_modified
+
+    body = response_cache.get(key)
+    if body is None:
+        generation = response_cache.generation
+        by_author, by_year, by_decade = await repo.stats()
+        total = sum(n for _, n in by_author)
+        body = dump_json({
+            "total": total,
+            "unknown_year": total - sum(n for _, n in by_year),
+            "by_author": [{"author": a, "books": n} for a, n in by_author],
+            "by_year": [{"year": y, "books": n} for y, n in by_year],
+            "by_decade": [{"decade": d, "books": n} for d, n in by_decade],
+        })
+        response_cache.put(key, body, generation)
+    return etag_response(request, body, headers)
+
+
+def book_dict(row) -> dict:
+    # Same field order as BookSchema
+    i, t, a, y = row
+    return {"title": t, "author": a, "year": y, "id": i}
+
+
+def json_response(body: bytes, headers: dict | None = None, status_code: int = 200) -> Response:
+    # Body is already encoded, FastAPI neither validates nor re-serializes it
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+async def check_etag(request: Request, repo: BookRepository, key: tuple) -> tuple[dict, Response | None]:
+    # ETag = catalog version + query. Returns the headers for the response and, when the
+    # client's copy is current, a ready 304 to send instead.
+    version = await repo.catalog_version()
+    response_cache.observe_version(version)
+    digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+    etag = f'W/"{version}-{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return headers, Response(status_code=304, headers=headers)
+    return headers, None
+
+
+def etag_response(request: Request, body: bytes, headers: dict) -> Response:
+    # "If-None-Match: *" only matches a representation that exists, so it's answered once the
+    # body is built; a missing book still gets its 404
+    if request.headers.get("if-none-match", "").strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return json_response(body, headers)
 
 
 @app.get("/books")
-async def get_books(session: SessionDep,
+async def get_books(request: Request, repo: RepositoryDep,
                     limit: int = Query(10, ge=1, le=100),
                     offset: int = Query(0, ge=0),
+                    after: str | None = Query(default=None),
                     ):
-    # Return list of all books
-    query = select(BookModel).limit(limit).offset(offset)
-    result = await session.execute(query)
-    books = result.scalars().all()
-    if not books:
+    key = ("books", limit, offset, after)
+    headers, not_modified = await check_etag(request, repo, key)
+    if not_modified is not None:
+        return not_modified
+
+    body = response_cache.get(key)
+    if body is None:
+        generation = response_cache.generation
+        body = dump_json(await list_books(repo, limit, offset, after))
+        response_cache.put(key, body, generation)
+    return etag_response(request, body, headers)
+
+
+async def list_books(repo: BookRepository, limit: int, offset: int, after: str | None):
+    if after is not None:
+        # Cursor mode — seek by id, cost doesn't depend on page depth
+        rows = await repo.list_after(decode_cursor(after), limit + 1)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "items": [book_dict(r) for r in rows],
+            "next_cursor": encode_cursor(rows[-1][0]) if has_more else None,
+        }
+
+    # Return list of all books (offset mode, kept for compatibility)
+    rows = await repo.list_offset(limit, offset)
+    if not rows:
         return "There are no books."
-    return [BookSchema(id=b.id, title=b.title, author=b.author, year=b.year) for b in books]
+    return [book_dict(r) for r in rows]
 
 @app.delete("/books/{book_id}")
-async def delete_book(book_id: int, session: SessionDep):
+async def delete_book(book_id: int, repo: RepositoryDep):
     # Delete a book by ID
-    query = delete(BookModel).where(BookModel.id == book_id)
-    result = await session.execute(query)
-    await session.commit()
-    if result.rowcount == 0:
-        raise HTTPException(status_code=404, detail="Book not found")
+    version = await repo.delete(book_id)
+    response_cache.invalidate(("book", book_id), version=version)
     return {"success": "Book successfully deleted"}
 
+def search_words(q: str) -> list[str]:
+    # Every word must match, the last characters may be an unfinished word
+    words = re.findall(r"\w+", q)
+    if not words:
+        raise HTTPException(status_code=400, detail="Search query has no words")
+    return words
+
+
+async def search_books_fts(repo: BookRepository, q: str, year: int | None,
+                           limit: int, after: str | None) -> dict:
+    # Full-text search, paged with a position cursor
+    position = decode_cursor(after or "", kind="pos")
+    rows = await repo.search_text(search_words(q), year, limit + 1, position)
+    has_more = len(rows) > limit
+    return {
+        "items": [book_dict(r) for r in rows[:limit]],
+        "next_cursor": encode_cursor(position + limit, kind="pos") if has_more else None,
+    }
+
+
+async def search_books_fuzzy(repo: BookRepository, q: str, year: int | None,
+                             limit: int, threshold: float) -> dict:
+    # Typo-tolerant search: each query word is replaced by similar words of the catalog
+    # vocabulary, books containing one of them for every query word are ranked by how close
+    # their words are (mean of the best similarity per query word)
+    options = []
+    for word in dict.fromkeys(fold_text(word) for word in search_words(q)):
+        if indexable(word):
+            similar = await repo.similar_words(word, threshold, FUZZY_EXPANSIONS)
+        else:
+            similar = [(word, 1.0)] # Numbers and short words have to match as they are
+        if not similar:
+            return {"items": []}
+        options.append(dict(similar))
+
+    rows = await repo.match_words([list(similar) for similar in options], year, FUZZY_CANDIDATES)
+    if len(rows) == FUZZY_CANDIDATES:
+        # More matches than candidates: make sure the books with the best words are among them
+        rows += await repo.match_words([[next(iter(similar))] for similar in options], year, limit)
+
+    ranked = {}
+    for row in rows:
+        words = text_words(f"{row[1]} {row[2]}")
+        # default: FTS5 splits a few characters (e.g. "_") that \w keeps inside words
+        score = sum(max((s for w, s in similar.items() if w in words), default=0.0) for similar in options) / len(options)
+        ranked[row[0]] = (score, row)
+    best = sorted(ranked.values(), key=lambda match: (-match[0], match[1][0]))[:limit]
+    return {"items": [{**book_dict(row), "similarity": round(score, 3)} for score, row in best]}
+
+
 @app.get("/books/search")
-async def get_book(session: SessionDep,
+async def get_book(request: Request, repo: RepositoryDep,
                    title: str | None = Query(default=None),
                    author: str | None = Query(default=None),
-                   year: int | None = Query(default=None)):
-    query = select(BookModel)
+                   year: int | None = Query(default=None),
+                   q: str | None = Query(default=None, min_length=1),
+                   limit: int = Query(10, ge=1, le=100),
+                   after: str | None = Query(default=None),
+                   fuzzy: bool = Query(False),
+                   threshold: float = Query(FUZZY_THRESHOLD, gt=0, le=1)):
+    if fuzzy:
+        if q is None:
+            raise HTTPException(status_code=400, detail="Fuzzy search needs q")
+        if after is not None:
+            raise HTTPException(status_code=400, detail="Fuzzy search results are not paged")
+        # A vocabulary refresh changes results without a catalog write, so it's part of the key
+        key = ("search:fuzzy", " ".join(normalize_key(q).split()), year, limit, threshold, vocabulary.version)
+    elif q is not None:
+        key = ("search:fts", " ".join(normalize_key(q).split()), year, limit, after)
+    else:
+        key = ("search", title and normalize_key(title), author and normalize_key(author), year)
+    headers, not_modified = await check_etag(request, repo, key)
+    if not_modified is not None:
+        return not_modified
+
+    body = response_cache.get(key)
+    if body is None:
+        generation = response_cache.generation
+        if fuzzy:
+            body = dump_json(await search_books_fuzzy(repo, q, year, limit, threshold))
+        elif q is not None:
+            # Full-text mode — prefix and multi-word matching over title and author
+            body = dump_json(await search_books_fts(repo, q, year, limit, after))
+        else:
+            body = dump_json(await find_books(repo, title, author, year))
+        response_cache.put(key, body, generation)
+    return etag_response(request, body, headers)
+
+
+async def find_books(repo: BookRepository, title: str | None, author: str | None, year: int | None) -> list[dict]:
     # Flexible search — match by title/author/year
-    conditions = []
-    if title:
-        conditions.append(func.lower(BookModel.title) == title.lower())
-    if author:
-        conditions.append(func.lower(BookModel.author) == author.lower())
-    if year is not None:
-        conditions.append(BookModel.year == year)
-
-    if conditions:
-        query = query.where(*conditions)
-
-    result = await session.execute(query)
-    books = result.scalars().all()
-    if not books:
+    rows = await repo.find(title and normalize_key(title), author and normalize_key(author), year)
+    if not rows:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    return books
+    return [book_dict(r) for r in rows]
+
+
+@app.get("/books/{book_id}", response_model=BookSchema)
+async def get_book_by_id(book_id: int, request: Request, repo: RepositoryDep) -> BookSchema:
+    key = ("book", book_id)
+    headers, not_modified = await check_etag(request, repo, key)
+    if not_modified is not None:
+        return not_modified
+
+    body = response_cache.get(key)
+    if body is None:
+        generation = response_cache.generation
+        row = await repo.get(book_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        body = dump_json(book_dict(row))
+        response_cache.put(key, body, generation, by_id=True)
+    return etag_response(request, body, headers)
+
+
+async def update_book(repo: BookRepository, book_id: int, values: dict) -> BookSchema:
+    if not values:
+        raise HTTPException(status_code=400, detail="Bad Request")
+    row, version = await repo.update(book_id, values)
+    response_cache.invalidate(("book", book_id), version=version)
+    return BookSchema(**book_dict(row))
+
 
 @app.put("/books/{book_id}")
-async def change_book(book_id: int, session: SessionDep,
+async def change_book(book_id: int, repo: RepositoryDep,
                    title: str | None = Query(default=None),
                    author: str | None = Query(default=None),
                    year: int | None = Query(default=None)):
-    # Check if the book with these values is existing
-    values: dict[str, object] = {}
-    if title is not None:
-        values["title"] = title
-    if author is not None:
-        values["author"] = author
-    if year is not None:
-        values["year"] = year
+    # Update book details by ID
+    changes = {"title": title, "author": author, "year": year}
+    return await update_book(repo, book_id, {k: v for k, v in changes.items() if v is not None})
 
-    if not values:
-        raise HTTPException(status_code=400, detail="Bad Request")
-    # Check if the duplicate exists
-    conditions = []
-    if "title" in values:
-        conditions.append(func.lower(BookModel.title) == values["title"].lower())
-    if "author" in values:
-        conditions.append(func.lower(BookModel.author) == values["author"].lower())
-    if "year" in values:
-        conditions.append(BookModel.year == values["year"])
-
-    if conditions:
-        dup_query = select(BookModel).where(
-            *conditions,
-            BookModel.id != book_id,
-        )
-        dup_result = await session.execute(dup_query)
-        existing = dup_result.scalar_one_or_none()
-        if existing is not None:
-            raise HTTPException(status_code=409, detail="This book already exists.")
 
-    # Update book details by ID
-    values = {}
-    if title is not None:
-        values["title"] = title
-    if author is not None:
-        values["author"] = author
-    if year is not None:
-        values["year"] = year
+@app.patch("/books/{book_id}", response_model=BookSchema)
+async def patch_book(book_id: int, changes: BookPatchSchema, repo: RepositoryDep) -> BookSchema:
+    # Partial update from a JSON body
+    return await update_book(repo, book_id, changes.model_dump(exclude_unset=True))
 
-    if not values:
-        raise HTTPException(status_code=400, detail="Bad Request")
 
-    query = update(BookModel).where(BookModel.id == book_id).values(**values)
-    result = await session.execute(query)
-    await session.commit()
+# Background imports — job rows live in books.db (import_jobs), so any worker can report on
+# a job; the upload itself is processed by the worker that accepted it
+
+# Jobs of a worker that died would keep their status, and a running slot or their place in
+# line, forever
+_FAIL_ABANDONED_JOBS = (
+    "UPDATE import_jobs SET status = 'failed', detail = 'Abandoned by its worker', finished = :now "
+    "WHERE status IN ('queued', 'running') AND updated < :stale"
+)
+
+
+class SqliteJobStore(JobStore):
+    # Every write is one short transaction on the writer connection, which SQLite serializes
+    # across processes; that's what makes claiming a running slot atomic
+
+    async def add(self, job: ImportJob) -> None:
+        now = time.time()
+        values = {**self._values(job), "submitted": now, "updated": now}
+        async with engine.begin() as conn:
+            await conn.execute(text(f"INSERT INTO import_jobs ({', '.join(values)}) "
+                                    f"VALUES ({', '.join(':' + name for name in values)})"), values)
+
+    async def claim(self, job: ImportJob, max_running: int) -> bool:
+        now = time.time()
+        async with engine.begin() as conn:
+            await conn.execute(text(_FAIL_ABANDONED_JOBS), {"now": now, "stale": now - STALE_SECONDS})
+            claimed = await conn.execute(text(
+                "UPDATE import_jobs SET status = 'running', started = :now, updated = :now "
+                "WHERE id = :id AND status = 'queued' "
+                "AND (SELECT COUNT(*) FROM import_jobs WHERE status = 'running') < :max_running "
+                "AND NOT EXISTS (SELECT 1 FROM import_jobs AS older WHERE older.status = 'queued' "
+                "AND older.submitted < import_jobs.submitted)"
+            ), {"id": job.id, "now": now, "max_running": max_running})
+            if claimed.rowcount:
+                job.status = "running"
+                job.started = now
+                return True
+            # Still waiting, not abandoned
+            await conn.execute(text("UPDATE import_jobs SET updated = :now WHERE id = :id"),
+                               {"id": job.id, "now": now})
+            return False
+
+    async def save(self, job: ImportJob) -> bool:
+        # A job already done or failed in the table stays that way, e.g. one a slow worker was
+        # thought to have abandoned
+        values = {**self._values(job), "updated": time.time()}
+        async with engine.begin() as conn:
+            saved = await conn.execute(text(
+                f"UPDATE import_jobs SET {', '.join(f'{name} = :{name}' for name in values)} "
+                "WHERE id = :id AND status NOT IN ('done', 'failed')"
+            ), values)
+        return bool(saved.rowcount)
+
+    async def fail_abandoned(self) -> None:
+        # Checked on a reader first, so polling only takes the write lock when there is work
+        now = time.time()
+        async with read_engine.connect() as conn:
+            stale = (await conn.execute(text(
+                "SELECT 1 FROM import_jobs WHERE status IN ('queued', 'running') AND updated < :stale LIMIT 1"
+            ), {"stale": now - STALE_SECONDS})).first()
+        if stale is not None:
+            async with engine.begin() as conn:
+                await conn.execute(text(_FAIL_ABANDONED_JOBS), {"now": now, "stale": now - STALE_SECONDS})
+
+    async def get(self, job_id: str) -> ImportJob | None:
+        await self.fail_abandoned()
+        async with read_engine.connect() as conn:
+            row = (await conn.execute(text(f"SELECT {', '.join(JOB_FIELDS)} FROM import_jobs WHERE id = :id"),
+                                      {"id": job_id})).mappings().first()
+        if row is None:
+            return None
+        return ImportJob.from_state({**row, "errors": json.loads(row["errors"])})
+
+    async def counts(self) -> dict[str, int]:
+        await self.fail_abandoned()
+        async with read_engine.connect() as conn:
+            counts = dict((await conn.exec_driver_sql(
+                "SELECT status, COUNT(*) FROM import_jobs GROUP BY status")).all())
+        return {status: counts.get(status, 0) for status in ("queued", "running", "done", "failed")}
+
+    async def prune(self, max_history: int) -> None:
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "DELETE FROM import_jobs WHERE status IN ('done', 'failed') AND id NOT IN "
+                "(SELECT id FROM import_jobs WHERE status IN ('done', 'failed') ORDER BY finished DESC LIMIT :keep)"
+            ), {"keep": max_history})
+
+    @staticmethod
+    def _values(job: ImportJob) -> dict:
+        state = job.state()
+        state["errors"] = json.dumps(state["errors"])
+        return state
 
-    if result.rowcount == 0:
-        raise HTTPException(status_code=404, detail="Book not found")
-    # Return updated book
-    row = await  session.execute(select(BookModel).where(BookModel.id == book_id))
-    book = row.scalar_one()
-    return BookSchema(id=book.id, title=book.title, author=book.author, year=book.year)
+
+async def process_import(records: AsyncIterator[object]) -> AsyncIterator[list[dict]]:
+    async with open_repository() as repo:
+        async for results in insert_records(repo, records, IMPORT_CHUNK_SIZE):
+            if any(r["status"] == "created" for r in results):
+                response_cache.invalidate()
+            yield results
+
+
+import_manager = ImportManager(
+    spool_dir=os.getenv("BOOKS_IMPORT_DIR", os.path.join(tempfile.gettempdir(), "books-imports")),
+    max_running=int(os.getenv("BOOKS_IMPORT_CONCURRENCY", "1")),
+    process=process_import,
+    store=MemoryJobStore() if STORAGE_BACKEND == "memory" else SqliteJobStore(),
+)
+
+
+@app.post("/imports", status_code=202)
+async def start_import(request: Request, format: Literal["ndjson", "csv"] | None = Query(default=None)):
+    # Request body is the file itself (text/csv or application/x-ndjson); returns at once
+    # with the job, the rows are inserted in the background
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    job = await import_manager.submit(request.stream(), fmt)
+    return json_response(dump_json(job.report()), {"Location": f"/imports/{job.id}"}, status_code=202)
+
+
+@app.get("/imports/{import_id}")
+async def get_import(import_id: str) -> dict:
+    # Progress: rows processed, rows/sec, conflicts and errors
+    report = await import_manager.report(import_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return report
+
+
+# Startup — run by lifespan in every worker before it accepts requests
+
+MIGRATE_ON_STARTUP = os.getenv("BOOKS_MIGRATE_ON_STARTUP", "1") == "1"
+WARM_UP = os.getenv("BOOKS_WARM_UP", "1") == "1"
+
+startup_timings: dict[str, float] = {} # phase -> seconds, last startup of this process
+
+
+async def migrate_on_startup() -> None:
+    # Creates missing tables/columns/indexes, never drops anything
+    if MIGRATE_ON_STARTUP:
+        await migrate_database()
+
+
+async def warm_pool() -> None:
+    # Open every pooled connection now, so pragmas and file opening are not paid by a request
+    if not WARM_UP:
+        return
+    for pool_engine in {engine, read_engine}:
+        async with AsyncExitStack() as stack:
+            for _ in range(pool_engine.pool.size()):
+                conn = await stack.enter_async_context(pool_engine.connect())
+                await conn.exec_driver_sql("SELECT 1")
+
+
+async def warm_statements() -> None:
+    # Run the hot queries once so their compiled forms land in SQLAlchemy's statement cache.
+    # Cache keys depend only on statement structure, so real requests with other values hit them.
+    if not WARM_UP:
+        return
+    async with new_read_session() as session:
+        repo = SqliteBookRepository(session)
+        await repo.catalog_version()
+        await list_books(repo, 10, 0, None)
+        await list_books(repo, 10, 0, encode_cursor(0))
+        await search_books_fts(repo, "warm", None, 10, None)
+        await repo.get(0)
+        # Every non-empty combination of structured search filters
+        for title, author, year in itertools.product([None, "warm"], [None, "warm"], [None, 0]):
+            if title or author or year is not None:
+                try:
+                    await find_books(repo, title, author, year)
+                except HTTPException:
+                    pass
+
+    # Write statements run inside a transaction that is rolled back
+    async with engine.connect() as conn:
+        await conn.begin()
+        try:
+            book_id, *_ = await insert_book_op(conn, "warm-up", "warm-up", None)
+            await update_book_op(conn, book_id, update_values({"title": "warm-up", "author": "warm-up", "year": 0}))
+            await update_book_op(conn, book_id, update_values({"year": 0}))
+            await delete_book_op(conn, book_id)
+        except HTTPException:
+            pass
+        await conn.rollback()
+
+
+async def load_vocabulary() -> None:
+    # Trigram index for fuzzy search, so the first fuzzy query doesn't build it
+    if not WARM_UP:
+        return
+    async with new_read_session() as session:
+        repo = SqliteBookRepository(session)
+        await repo.load_vocabulary(await repo.catalog_version())
+
+
+async def load_snapshot() -> None:
+    # Memory backend: the catalog starts as a copy of BOOKS_SNAPSHOT, or empty
+    if SNAPSHOT_PATH:
+        count = memory_repository.load_snapshot(SNAPSHOT_PATH)
+        startup_log.info("loaded %d books from %s", count, SNAPSHOT_PATH)
+
+
+if STORAGE_BACKEND == "memory":
+    STARTUP_PHASES = [("load_snapshot", load_snapshot)]
+else:
+    STARTUP_PHASES = [
+        ("migrate", migrate_on_startup),
+        ("warm_pool", warm_pool),
+        ("warm_statements", warm_statements),
+        ("load_vocabulary", load_vocabulary),
+    ]
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", reload=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Book API")
+    parser.add_argument("command", nargs="?", default="dev", choices=["dev", "serve", "migrate", "rebuild-fts", "rebuild-stats", "check-stats"])
+    parser.add_argument("--host", default=os.getenv("BOOKS_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("BOOKS_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BOOKS_WORKERS", "1")))
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        # Upgrade an existing books.db in place
+        async def run_migration():
+            await migrate_database()
+            await dispose_engines()
+
+        asyncio.run(run_migration())
+    elif args.command == "rebuild-fts":
+        # Repopulate books_fts, e.g. after restoring books.db from a dump
+        async def run_rebuild():
+            await rebuild_fts_index()
+            await dispose_engines()
+
+        asyncio.run(run_rebuild())
+    elif args.command == "rebuild-stats":
+        async def run_rebuild_stats():
+            await rebuild_stats_tables()
+            await dispose_engines()
+
+        asyncio.run(run_rebuild_stats())
+    elif args.command == "check-stats":
+        # Recompute the summary tables with GROUP BY and compare, exit code 1 on any mismatch
+        async def run_check():
+            try:
+                return await check_stats_tables()
+            finally:
+                await dispose_engines()
+
+        mismatches = asyncio.run(run_check())
+        for name, rows in mismatches.items():
+            for group, stored, actual in rows:
+                print(f"{name}: {group!r} stored={stored} actual={actual}")
+        print("stats are consistent" if not mismatches else "stats are out of sync, run rebuild-stats")
+        raise SystemExit(1 if mismatches else 0)
+    elif args.command == "serve":
+        # Production entry point: migrate once in this process, then fork the workers,
+        # so workers never run DDL concurrently
+        async def run_migration():
+            await migrate_database()
+            await dispose_engines()
+
+        asyncio.run(run_migration())
+        os.environ["BOOKS_MIGRATE_ON_STARTUP"] = "0" # Inherited by the workers
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
\ No newline at end of file
@@ -0,0 +1,175 @@
+import bisect
+import logging
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Minimal Prometheus-style registry. Updates are plain dict/list operations on the event
+# loop thread (or the single aiosqlite worker call that triggers an engine event), so
+# observing a value costs a bisect and a few additions.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 1000, 10000)
+
+slow_query_log = logging.getLogger("books.slow_query")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self, kind: str = "counter") -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {kind}"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *label_values, value: float) -> None:
+        self.values[label_values] = value
+
+    def dec(self, *label_values, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def render(self, kind: str = "gauge") -> list[str]:
+        return super().render(kind)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        state = self.values.get(label_values)
+        if state is None:
+            state = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels, label_values, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled", ("method",))
+SQL_LATENCY = Histogram("sql_statement_duration_seconds", "SQL statement latency", ("engine", "operation"))
+SQL_ROWS = Histogram("sql_statement_rows", "Rows returned (SELECT) or affected (DML) per statement",
+                     ("engine", "operation"), buckets=ROW_BUCKETS)
+POOL_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection", ("engine",))
+SLOW_QUERIES = Counter("sql_slow_queries_total", "Statements slower than the slow query threshold", ("engine",))
+
+METRICS = [REQUEST_LATENCY, REQUESTS_IN_FLIGHT, SQL_LATENCY, SQL_ROWS, POOL_WAIT, SLOW_QUERIES]
+
+
+def render(extra: list | None = None) -> str:
+    lines = []
+    for metric in METRICS + (extra or []):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    # Pure ASGI middleware — times every HTTP request by method, route template and status
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        started = time.perf_counter()
+        REQUESTS_IN_FLIGHT.inc(method)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(method)
+            # Router stores the matched route in scope, so paths with ids share one series
+            route = scope.get("route")
+            REQUEST_LATENCY.observe(time.perf_counter() - started, method,
+                                    route.path if route is not None else "unmatched", status)
+
+
+def measured_pool(engine_name: str):
+    # Queue pool that records how long a checkout had to wait for a free connection
+    class MeasuredPool(AsyncAdaptedQueuePool):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                POOL_WAIT.observe(time.perf_counter() - started, engine_name)
+
+    return MeasuredPool
+
+
+def instrument_engine(sync_engine, engine_name: str, slow_query_ms: float = 0) -> None:
+    # SQL latency and row counts via cursor execute events
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        SQL_LATENCY.observe(elapsed, engine_name, operation)
+
+        # The async adapter buffers SELECT results on execute, so they can be counted here
+        rows = getattr(cursor, "_rows", None)
+        if rows is not None and cursor.description is not None:
+            SQL_ROWS.observe(len(rows), engine_name, operation)
+        elif cursor.rowcount is not None and cursor.rowcount >= 0:
+            SQL_ROWS.observe(cursor.rowcount, engine_name, operation)
+
+        if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+            SLOW_QUERIES.inc(engine_name)
+            slow_query_log.warning("slow query on %s engine (%.1f ms): %s", engine_name, elapsed * 1000,
+                                   " ".join(statement.split()))
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(context):
+        # after_cursor_execute is skipped for failed statements
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
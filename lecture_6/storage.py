@@ -0,0 +1,345 @@
+import bisect
+import itertools
+import json
+import re
+import sqlite3
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+
+from fuzzy import TrigramIndex
+
+# Storage backends for the book API. Handlers only talk to a BookRepository, so the same
+# endpoints run on SQLite (main.SqliteBookRepository) or on the in-memory store below.
+# Rows are (id, title, author, year) tuples; title/author filters are normalized keys.
+
+Row = tuple[int, str, str, int | None]
+
+
+def normalize_key(value: str) -> str:
+    # Normalized form stored in title_key/author_key
+    return value.casefold()
+
+
+class BookRepository(ABC):
+    # Reads
+    @abstractmethod
+    async def catalog_version(self) -> int:
+        # Bumped once per inserted, updated or deleted row; ETags and the cache follow it
+        ...
+
+    @abstractmethod
+    async def get(self, book_id: int) -> Row | None:
+        ...
+
+    @abstractmethod
+    async def list_offset(self, limit: int, offset: int) -> list[Row]:
+        ...
+
+    @abstractmethod
+    async def list_after(self, last_id: int, limit: int) -> list[Row]:
+        # Books with id > last_id in id order
+        ...
+
+    @abstractmethod
+    async def find(self, title_key: str | None, author_key: str | None, year: int | None) -> list[Row]:
+        ...
+
+    @abstractmethod
+    async def search_text(self, words: list[str], year: int | None, limit: int, offset: int) -> list[Row]:
+        # Every word must match the start of a word in title or author
+        ...
+
+    @abstractmethod
+    async def similar_words(self, word: str, threshold: float, limit: int) -> list[tuple[str, float]]:
+        # Words of titles and authors that look like word (folded), most similar first
+        ...
+
+    @abstractmethod
+    async def match_words(self, word_groups: list[list[str]], year: int | None, limit: int) -> list[Row]:
+        # Books containing at least one word of every group (whole words), the first limit by id
+        ...
+
+    @abstractmethod
+    async def stats(self) -> tuple[list, list, list]:
+        # (author, books), (year, books), (decade, books) sorted by group. Authors are grouped
+        # by author_key and named by their smallest spelling
+        ...
+
+    @abstractmethod
+    def export_batches(self, batch_size: int) -> AsyncIterator[list[Row]]:
+        # Whole catalog in id order
+        ...
+
+    # Writes — return the stored row and the catalog version right after the change
+    @abstractmethod
+    async def insert(self, title: str, author: str, year: int | None) -> tuple[Row, int]:
+        ...
+
+    @abstractmethod
+    async def update(self, book_id: int, values: dict) -> tuple[Row, int]:
+        ...
+
+    @abstractmethod
+    async def delete(self, book_id: int) -> int:
+        ...
+
+    @abstractmethod
+    async def insert_many(self, chunk: list[tuple[int, object]]) -> list[dict]:
+        # Bulk insert of (index, book) pairs, returns one created/conflict result per book
+        ...
+
+    @abstractmethod
+    async def reset(self) -> None:
+        # Drop every book
+        ...
+
+
+def fold_text(value: str) -> str:
+    # Same folding as the FTS tokenizer: case and diacritics are ignored
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def text_words(value: str) -> set[str]:
+    # Folded words of a title or author, as the full-text index sees them
+    return set(re.findall(r"\w+", fold_text(value)))
+
+
+class MemoryBookRepository(BookRepository):
+    # Whole catalog in process memory, for fast test runs and read-mostly edge deployments
+    # that load a snapshot at startup. Every method runs without awaiting, so each call is
+    # atomic on the event loop. Writes are not shared between worker processes.
+    #   _books:  id -> row                            (hash index on id)
+    #   _keys:   (title_key, author_key, year) -> id  (hash index enforcing uniqueness)
+    #   _ids:    sorted ids                           (offset and cursor paging)
+    #   _authors / _words: author_key and folded word -> ids, for search
+    #   _fuzzy:  trigram index over the keys of _words, for fuzzy search
+
+    def __init__(self):
+        self.reset_sync()
+
+    def reset_sync(self) -> None:
+        self._books: dict[int, Row] = {}
+        self._keys: dict[tuple, int] = {}
+        self._ids: list[int] = []
+        self._authors: dict[str, set[int]] = {}
+        self._words: dict[str, set[int]] = {}
+        self._sorted_words: list[str] | None = None
+        self._fuzzy = TrigramIndex()
+        self._by_author: dict[str, Counter] = {} # author_key -> books per spelling
+        self._by_year = Counter()
+        self._by_decade = Counter()
+        self.version = 0
+
+    # Index maintenance
+
+    @staticmethod
+    def _key(title: str, author: str, year: int | None) -> tuple | None:
+        # Books without a year are never duplicates, like NULLs in the SQLite unique index
+        return None if year is None else (normalize_key(title), normalize_key(author), year)
+
+    @staticmethod
+    def _row_words(row: Row) -> set[str]:
+        return text_words(f"{row[1]} {row[2]}")
+
+    def _add(self, row: Row) -> None:
+        book_id, title, author, year = row
+        self._books[book_id] = row
+        key = self._key(title, author, year)
+        if key is not None:
+            self._keys[key] = book_id
+        if not self._ids or book_id > self._ids[-1]:
+            self._ids.append(book_id)
+        else:
+            bisect.insort(self._ids, book_id)
+        self._authors.setdefault(normalize_key(author), set()).add(book_id)
+        for word in self._row_words(row):
+            if word not in self._words:
+                self._words[word] = set()
+                self._sorted_words = None
+                self._fuzzy.add(word)
+            self._words[word].add(book_id)
+        self._by_author.setdefault(normalize_key(author), Counter())[author] += 1
+        if year is not None:
+            self._by_year[year] += 1
+            self._by_decade[year // 10 * 10] += 1
+
+    def _remove(self, book_id: int) -> Row:
+        row = self._books.pop(book_id)
+        _, title, author, year = row
+        key = self._key(title, author, year)
+        if key is not None:
+            self._keys.pop(key, None)
+        del self._ids[bisect.bisect_left(self._ids, book_id)]
+        self._discard(self._authors, normalize_key(author), book_id)
+        for word in self._row_words(row):
+            self._discard(self._words, word, book_id)
+            if word not in self._words:
+                self._sorted_words = None
+                self._fuzzy.discard(word)
+        for counter, group in ((self._by_author[normalize_key(author)], author), (self._by_year, year),
+                               (self._by_decade, None if year is None else year // 10 * 10)):
+            if group is not None:
+                counter[group] -= 1
+                if not counter[group]:
+                    del counter[group]
+        if not self._by_author[normalize_key(author)]:
+            del self._by_author[normalize_key(author)]
+        return row
+
+    @staticmethod
+    def _discard(index: dict[str, set[int]], key: str, book_id: int) -> None:
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(book_id)
+            if not ids:
+                del index[key]
+
+    def _next_id(self) -> int:
+        # max(id) + 1, the same ids SQLite hands out for an INTEGER PRIMARY KEY
+        return self._ids[-1] + 1 if self._ids else 1
+
+    def load(self, rows) -> int:
+        # Fill the store from (id, title, author, year) rows, e.g. a snapshot
+        count = 0
+        for book_id, title, author, year in rows:
+            self._add((book_id, title, author, year))
+            count += 1
+        self.version += count
+        return count
+
+    def load_snapshot(self, path: str) -> int:
+        # NDJSON from GET /books/export, or a books.db file
+        if path.endswith((".ndjson", ".jsonl")):
+            with open(path, encoding="utf-8") as f:
+                records = (json.loads(line) for line in f if line.strip())
+                return self.load((r["id"], r["title"], r["author"], r.get("year")) for r in records)
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return self.load(conn.execute("SELECT id, title, author, year FROM books ORDER BY id"))
+        finally:
+            conn.close()
+
+    # Reads
+
+    async def catalog_version(self) -> int:
+        return self.version
+
+    async def get(self, book_id: int) -> Row | None:
+        return self._books.get(book_id)
+
+    async def list_offset(self, limit: int, offset: int) -> list[Row]:
+        return [self._books[i] for i in self._ids[offset:offset + limit]]
+
+    async def list_after(self, last_id: int, limit: int) -> list[Row]:
+        start = bisect.bisect_right(self._ids, last_id)
+        return [self._books[i] for i in self._ids[start:start + limit]]
+
+    async def find(self, title_key: str | None, author_key: str | None, year: int | None) -> list[Row]:
+        if title_key and author_key and year is not None:
+            book_id = self._keys.get((title_key, author_key, year))
+            return [] if book_id is None else [self._books[book_id]]
+        ids = sorted(self._authors.get(author_key, ())) if author_key else self._ids
+        return [
+            row for row in (self._books[i] for i in ids)
+            if (not title_key or normalize_key(row[1]) == title_key)
+            and (not author_key or normalize_key(row[2]) == author_key)
+            and (year is None or row[3] == year)
+        ]
+
+    def _prefix_ids(self, word: str) -> set[int]:
+        if self._sorted_words is None:
+            self._sorted_words = sorted(self._words)
+        ids = set()
+        start = bisect.bisect_left(self._sorted_words, word)
+        for candidate in self._sorted_words[start:]:
+            if not candidate.startswith(word):
+                break
+            ids |= self._words[candidate]
+        return ids
+
+    async def search_text(self, words: list[str], year: int | None, limit: int, offset: int) -> list[Row]:
+        # No relevance ranking here, matches come back in id order
+        matches = None
+        for word in words:
+            ids = self._prefix_ids(fold_text(word))
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                return []
+        rows = (self._books[i] for i in sorted(matches))
+        if year is not None:
+            rows = (row for row in rows if row[3] == year)
+        return list(rows)[offset:offset + limit]
+
+    async def similar_words(self, word: str, threshold: float, limit: int) -> list[tuple[str, float]]:
+        return self._fuzzy.similar(word, threshold, limit)
+
+    async def match_words(self, word_groups: list[list[str]], year: int | None, limit: int) -> list[Row]:
+        groups = [set().union(*(self._words.get(word, ()) for word in words)) for words in word_groups]
+        rows = (self._books[i] for i in sorted(set.intersection(*groups)))
+        if year is not None:
+            rows = (row for row in rows if row[3] == year)
+        return list(itertools.islice(rows, limit))
+
+    async def stats(self) -> tuple[list, list, list]:
+        by_author = [(min(names), sum(names.values())) for _, names in sorted(self._by_author.items())]
+        return by_author, sorted(self._by_year.items()), sorted(self._by_decade.items())
+
+    async def export_batches(self, batch_size: int) -> AsyncIterator[list[Row]]:
+        ids = list(self._ids)
+        for start in range(0, len(ids), batch_size):
+            batch = [self._books.get(i) for i in ids[start:start + batch_size]]
+            yield [row for row in batch if row is not None]
+
+    # Writes
+
+    async def insert(self, title: str, author: str, year: int | None) -> tuple[Row, int]:
+        key = self._key(title, author, year)
+        if key is not None and key in self._keys:
+            raise HTTPException(status_code=409, detail="This book already exists.")
+        row = (self._next_id(), title, author, year)
+        self._add(row)
+        self.version += 1
+        return row, self.version
+
+    async def update(self, book_id: int, values: dict) -> tuple[Row, int]:
+        old = self._books.get(book_id)
+        if old is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+        row = (book_id, values.get("title", old[1]), values.get("author", old[2]), values.get("year", old[3]))
+        key = self._key(*row[1:])
+        if key is not None and self._keys.get(key, book_id) != book_id:
+            raise HTTPException(status_code=409, detail="This book already exists.")
+        self._remove(book_id)
+        self._add(row)
+        self.version += 1
+        return row, self.version
+
+    async def delete(self, book_id: int) -> int:
+        if book_id not in self._books:
+            raise HTTPException(status_code=404, detail="Book not found")
+        self._remove(book_id)
+        self.version += 1
+        return self.version
+
+    async def insert_many(self, chunk: list[tuple[int, object]]) -> list[dict]:
+        results = []
+        for index, book in chunk:
+            key = self._key(book.title, book.author, book.year)
+            if key is not None and key in self._keys:
+                results.append({"index": index, "status": "conflict"})
+                continue
+            book_id = self._next_id()
+            self._add((book_id, book.title, book.author, book.year))
+            self.version += 1
+            results.append({"index": index, "status": "created", "id": book_id})
+        return results
+
+    async def reset(self) -> None:
+        version = self.version
+        self.reset_sync()
+        self.version = version + 1